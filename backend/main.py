@@ -4,14 +4,23 @@
 """
 
 import json
+import mimetypes
+import sys
+from collections.abc import Mapping
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
 
 DATA_DIR = Path(__file__).parent / "data"
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from artifacts import block_of, precompressed  # noqa: E402
+from corpus import Corpus, CorpusView  # noqa: E402
+from ids_index import ComponentIndex, parse_term  # noqa: E402
+from substitute import BIBLIOGRAPHY, Substituter  # noqa: E402
 
 app = FastAPI(title="抽象构形管理", version="2.0.0")
 
@@ -29,9 +38,11 @@ _characters: list[dict] = []  # 按 codepoint 排序
 _char_map: dict[str, dict] = {}  # char -> entry
 _papers: list[dict] = []
 _paper_map: dict[str, str] = {}
+_comm_substituter = Substituter(BIBLIOGRAPHY)  # 注释渲染：文献编号 → 引文链接
 _ob: list[dict] = []
 _extra: list[dict] = []
 _cross_refs: dict | None = None  # 交叉索引（懒加载）
+_component_index: ComponentIndex | None = None  # 组件倒排索引（懒加载，标注变更后重建）
 
 
 def _load_json(name: str) -> dict:
@@ -64,6 +75,22 @@ def _save_jsonl(name: str, records: list[dict]):
             f.write(json.dumps(r, ensure_ascii=False) + "\n")
 
 
+def _parse_ies(lines: list[list[str]]) -> list[str]:
+    """同一字符多行时取最后一个非空行"""
+    vals: list[str] = []
+    for fields in lines:
+        vals = [v for v in fields if v] or vals
+    return vals
+
+
+def _parse_ids(lines: list[list[str]]) -> list[str]:
+    """ids 文件中分号分隔多个 IDS"""
+    vals: list[str] = []
+    for fields in lines:
+        vals = [sub.strip() for v in fields for sub in v.strip().split(";") if sub.strip()] or vals
+    return vals
+
+
 def _build_cross_refs():
     """构建所有数据源的字符交叉索引（懒加载）"""
     idx: dict = {}
@@ -149,45 +176,14 @@ def _build_cross_refs():
             sf_idx.setdefault(ch, []).append({"group": key, "label": val})
     idx["similar_fei"] = sf_idx
 
-    # ── ies ──
+    # ── ies / ids：内存映射语料，按需解析 ──
     ies_path = DATA_DIR / "ies20240314.txt"
-    ies_dict: dict[str, list[str]] = {}
     if ies_path.exists():
-        with open(ies_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line or "\t" not in line:
-                    continue
-                parts = line.split("\t")
-                ch = parts[0]
-                vals = [v for v in parts[1:] if v]
-                if ch and vals:
-                    ies_dict[ch] = vals
-    idx["ies"] = ies_dict
-
-    # ── ids ──
+        idx["ies"] = CorpusView(Corpus.open(ies_path), _parse_ies)
+
     ids_path = DATA_DIR / "ids_lv2.txt"
-    ids_dict: dict[str, list[str]] = {}
     if ids_path.exists():
-        with open(ids_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line or "\t" not in line:
-                    continue
-                parts = line.split("\t")
-                ch = parts[0]
-                vals = []
-                for v in parts[1:]:
-                    v = v.strip()
-                    if v:
-                        # ids 文件中分号分隔多个 IDS
-                        for sub in v.split(";"):
-                            sub = sub.strip()
-                            if sub:
-                                vals.append(sub)
-                if ch and vals:
-                    ids_dict[ch] = vals
-    idx["ids"] = ids_dict
+        idx["ids"] = CorpusView(Corpus.open(ids_path), _parse_ids)
 
     # ── jianhuazi ──
     jh = _load_json("jianhuazi.json")
@@ -199,6 +195,24 @@ def _build_cross_refs():
     return idx
 
 
+def _build_component_index() -> ComponentIndex:
+    """由所有 con 标注构建组件倒排索引"""
+    index = ComponentIndex()
+    for entry in _characters:
+        char = entry["char"]
+        for a in entry.get("annotations", []):
+            con = a.get("con", "").strip()
+            if not con or con == "X" or con.startswith("="):
+                continue
+            if con.startswith("*"):
+                con = f"{char}({con.removeprefix('*')})"
+            try:
+                index.add(char, con)
+            except ValueError:
+                pass  # 不合法的 IDS 不进索引
+    return index
+
+
 def _codepoint_sort_key(entry: dict) -> tuple:
     """按 Unicode 区块排序：URO → 兼容 → ExtA → ExtB → ..."""
     cp = entry.get("codepoint", "U+0")
@@ -207,33 +221,8 @@ def _codepoint_sort_key(entry: dict) -> tuple:
     except (ValueError, AttributeError):
         return (99, 0)
 
-    # 定义区块优先级
-    if 0x4E00 <= val <= 0x9FFF:
-        block = 0  # URO
-    elif 0xF900 <= val <= 0xFAFF:
-        block = 1  # 兼容（CJK Compatibility）
-    elif 0xFA00 <= val <= 0xFAFF:
-        block = 1
-    elif 0x3400 <= val <= 0x4DBF:
-        block = 2  # ExtA
-    elif 0x20000 <= val <= 0x2A6DF:
-        block = 3  # ExtB
-    elif 0x2A700 <= val <= 0x2B73F:
-        block = 4  # ExtC
-    elif 0x2B740 <= val <= 0x2B81F:
-        block = 5  # ExtD
-    elif 0x2B820 <= val <= 0x2CEAF:
-        block = 6  # ExtE
-    elif 0x2CEB0 <= val <= 0x2EBEF:
-        block = 7  # ExtF
-    elif 0x30000 <= val <= 0x3134F:
-        block = 8  # ExtG
-    elif 0x31350 <= val <= 0x323AF:
-        block = 9  # ExtH
-    elif 0x2EBF0 <= val <= 0x2EE5F:
-        block = 10  # ExtI
-    else:
-        block = 99  # 其他
+    # 区块优先级见 artifacts.BLOCKS，其他为 99
+    block = block_of(val)
 
     return (block, val)
 
@@ -271,7 +260,7 @@ def _migrate_annotations():
 
 
 def load_data():
-    global _characters, _char_map, _papers, _paper_map, _ob, _extra
+    global _characters, _char_map, _papers, _paper_map, _comm_substituter, _ob, _extra
 
     _characters = _load_jsonl("characters.jsonl")
     # 排序：按 Unicode codepoint
@@ -285,6 +274,7 @@ def load_data():
     paper_data = _load_json("papers.json")
     _papers = paper_data.get("papers", [])
     _paper_map = {p["id"]: p["citation"] for p in _papers}
+    _comm_substituter = Substituter({**BIBLIOGRAPHY, **{p["id"]: _render_citation(p) for p in _papers}})
 
     # 其他数据
     _ob = _load_jsonl("ob.jsonl")
@@ -309,6 +299,14 @@ async def startup():
 # ─── Helper ────────────────────────────────────────────────
 
 
+def _render_citation(paper: dict) -> str:
+    """文献 → 引文（有链接时为 <a> 标签），引文中的标点同样按 BIBLIOGRAPHY 替换"""
+    citation = Substituter(BIBLIOGRAPHY)(paper["citation"])
+    if paper.get("url"):
+        return f"<a href={paper['url']}>{citation}</a>"
+    return citation
+
+
 def _has_annotation(entry: dict) -> bool:
     """检查字符是否有任何标注"""
     annos = entry.get("annotations", [])
@@ -371,6 +369,35 @@ def search_characters(
     return {"total": total, "offset": offset, "limit": limit, "results": slim}
 
 
+@app.get("/api/components/search")
+def search_components(
+    q: str = Query("", description="组件条件，空格分隔取交集；如 亻@⿰0 表示在 ⿰ 左位，口@⿱ 表示在 ⿱ 之内"),
+    direct: bool = Query(False, description="仅匹配直接所属的结构"),
+    limit: int = Query(50, description="返回条数上限"),
+    offset: int = Query(0, description="偏移量"),
+):
+    """按组件及其位置检索字符，按 codepoint 排序"""
+    global _component_index
+    if _component_index is None:
+        _component_index = _build_component_index()
+
+    try:
+        terms = [parse_term(t) for t in q.split()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"无法解析的条件：{q}")
+    matched = _component_index.query(*terms, direct=direct)
+    results = [e for e in _characters if e["char"] in matched]
+    slim = [
+        {
+            "char": e["char"],
+            "codepoint": e.get("codepoint", ""),
+            "shapes": _component_index.shapes.get(e["char"], []),
+        }
+        for e in results[offset : offset + limit]
+    ]
+    return {"total": len(results), "offset": offset, "limit": limit, "results": slim}
+
+
 @app.get("/api/characters/first-unannotated")
 def first_unannotated():
     for entry in _characters:
@@ -401,7 +428,7 @@ def get_cross_refs(char: str):
 
     for src in ("guangyun", "shanggu", "unify_eiso", "similar_fei", "ies", "ids", "jianhuazi"):
         data = _cross_refs.get(src, {})
-        if isinstance(data, dict) and char in data:
+        if isinstance(data, Mapping) and char in data:
             result[src] = data[char]
 
     return result
@@ -414,7 +441,7 @@ def get_character(char: str):
         return {
             "char": entry["char"],
             "codepoint": entry.get("codepoint", ""),
-            "annotations": entry.get("annotations", []),
+            "annotations": [{**a, "comm_html": _comm_substituter(a.get("comm", ""))} for a in entry.get("annotations", [])],
         }
     raise HTTPException(status_code=404, detail=f"字符 {char} 未找到")
 
@@ -502,6 +529,8 @@ def create_extra(data: ExtraCreate):
 
 
 def _save_characters():
+    global _component_index
+    _component_index = None
     _save_jsonl("characters.jsonl", _characters)
 
 
@@ -688,16 +717,34 @@ def list_ids():
 FRONTEND_DIR = Path(__file__).parent.parent / "frontend"
 
 
+def _file_response(path: Path, accept_encoding: str) -> FileResponse:
+    """有预压缩文件（.br/.gz，见 artifacts.compress_artifacts）且客户端接受时直接返回压缩字节"""
+    variant, encoding = precompressed(path, accept_encoding)
+    if encoding is None:
+        return FileResponse(path, headers={"Vary": "Accept-Encoding"})
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    return FileResponse(variant, media_type=media_type, headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+
+
+@app.get("/api/files/{name}")
+def get_data_file(name: str, accept_encoding: str = Header("")):
+    """原样返回 data 目录下的 JSON 文件（如 jianhuazi.json），优先使用预压缩版本"""
+    path = DATA_DIR / name
+    if path.suffix != ".json" or path.parent != DATA_DIR or not path.is_file():
+        raise HTTPException(status_code=404, detail=f"文件 {name} 未找到")
+    return _file_response(path, accept_encoding)
+
+
 @app.get("/")
 def serve_index():
     return FileResponse(FRONTEND_DIR / "index.html")
 
 
 @app.get("/{path:path}")
-def serve_static(path: str):
+def serve_static(path: str, accept_encoding: str = Header("")):
     file_path = FRONTEND_DIR / path
     if file_path.exists() and file_path.is_file():
-        return FileResponse(file_path)
+        return _file_response(file_path, accept_encoding)
     return FileResponse(FRONTEND_DIR / "index.html")
 
 
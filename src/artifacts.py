@@ -0,0 +1,176 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+from bisect import bisect_right
+from pathlib import Path
+from typing import Callable, Iterable, Optional, TextIO
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are written without it
+    brotli = None
+
+# CJK blocks in display order; the position of a block is its sort priority, 99 for everything else
+BLOCKS: tuple[tuple[str, int, int], ...] = (
+    ("URO", 0x4E00, 0x9FFF),
+    ("Compat", 0xF900, 0xFAFF),
+    ("ExtA", 0x3400, 0x4DBF),
+    ("ExtB", 0x20000, 0x2A6DF),
+    ("ExtC", 0x2A700, 0x2B73F),
+    ("ExtD", 0x2B740, 0x2B81F),
+    ("ExtE", 0x2B820, 0x2CEAF),
+    ("ExtF", 0x2CEB0, 0x2EBEF),
+    ("ExtG", 0x30000, 0x3134F),
+    ("ExtH", 0x31350, 0x323AF),
+    ("ExtI", 0x2EBF0, 0x2EE5F),
+)
+OTHER = 99
+MANIFEST = "manifest.json"
+COMPRESSED_MANIFEST = "compressed.json"
+ENCODINGS = {"br": ".br", "gzip": ".gz"}  # Content-Encoding -> suffix, by preference
+
+_STARTS = sorted((first, last, index) for index, (_, first, last) in enumerate(BLOCKS))
+_FIRSTS = [first for first, _, _ in _STARTS]
+
+
+def block_of(codepoint: int) -> int:
+    position = bisect_right(_FIRSTS, codepoint) - 1
+    if position >= 0 and codepoint <= _STARTS[position][1]:
+        return _STARTS[position][2]
+    return OTHER
+
+
+def block_name(block: int) -> str:
+    return BLOCKS[block][0] if block != OTHER else "Other"
+
+
+def shard_entries(entries: Iterable[dict]) -> dict[str, list[dict]]:
+    # entries by block of their character, in block order; entries without a character go to `extra`
+    shards: dict[int, list[dict]] = {}
+    for entry in entries:
+        block = block_of(ord(entry["char"][0])) if entry.get("char") else -1
+        shards.setdefault(block, []).append(entry)
+    return {("extra" if block < 0 else f"entries-{block_name(block)}"): shards[block] for block in sorted(shards, key=lambda b: (b < 0, b))}
+
+
+def write_shards(directory: Path, document: dict, dump: Callable[[TextIO, object], None]) -> dict:
+    # writes `document` (as built by `build_json.txt_to_json`) as one file per block of entries, plus the shapes,
+    # the OB groups and geta, and a manifest of their names, sizes and SHA-256; files whose content did not change
+    # are left untouched, and any other JSON file in `directory` (a block that no longer has entries, or one left
+    # by a build whose manifest was lost) is removed, so the directory holds exactly what the manifest lists
+    parts = {name: {"entries": entries} for name, entries in shard_entries(document["entries"]).items()}
+    parts["shapes"] = {"shapes": document["shapes"], "shape_count": document["shape_count"]}
+    parts["ob"] = {"ob": document["ob"]}
+    parts["geta"] = {"geta": document["geta"]}
+
+    directory.mkdir(parents=True, exist_ok=True)
+    shards = []
+    for name, part in parts.items():
+        text = io.StringIO()
+        dump(text, part)
+        data = text.getvalue().encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = directory / f"{name}.json"
+        if not path.exists() or path.read_bytes() != data:
+            path.write_bytes(data)
+        shards.append({"name": path.name, "size": len(data), "sha256": digest, "count": len(next(iter(part.values())))})
+
+    written = {shard["name"] for shard in shards} | {MANIFEST}
+    for path in directory.glob("*.json"):
+        if path.name not in written:
+            path.unlink()
+
+    manifest = {"shards": shards}
+    with (directory / MANIFEST).open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def _compress(encoding: str, data: bytes) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return brotli.compress(data, quality=11)
+
+
+def compress_artifacts(paths: Iterable[Path], manifest_path: Path) -> dict:
+    # writes `<file>.gz` (and `<file>.br` when brotli is installed) next to every file, and a manifest of their
+    # SHA-256 and sizes; a file whose hash matches the manifest and whose variants exist is not compressed again.
+    # The manifest itself is skipped: it is rewritten below, so its own record would always be stale. Variants of
+    # files that the previous manifest listed but `paths` no longer does, and variants whose file is gone from the
+    # directories of `paths`, are removed.
+    encodings = [encoding for encoding in ENCODINGS if encoding != "br" or brotli is not None]
+    previous: dict[str, dict] = {}
+    if manifest_path.exists():
+        with manifest_path.open("r", encoding="utf-8") as f:
+            previous = json.load(f)
+
+    manifest = {}
+    for path in paths:
+        if path.resolve() == manifest_path.resolve():
+            continue
+        data = path.read_bytes()
+        key = path.relative_to(manifest_path.parent).as_posix()
+        record = {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+        old = previous.get(key, {})
+        for encoding in encodings:
+            variant = path.with_name(path.name + ENCODINGS[encoding])
+            if old.get("sha256") == record["sha256"] and encoding in old and variant.exists():
+                record[encoding] = old[encoding]
+                os.utime(variant)  # still matches the (possibly rewritten) file
+                continue
+            compressed = _compress(encoding, data)
+            variant.write_bytes(compressed)
+            record[encoding] = len(compressed)
+        manifest[key] = record
+
+    orphans = [manifest_path.parent / key for key in previous.keys() - manifest.keys()]
+    for directory in {path.parent for path in paths}:
+        for suffix in ENCODINGS.values():
+            for variant in directory.glob("*.json" + suffix):
+                source = variant.with_name(variant.name.removesuffix(suffix))
+                if not source.exists():
+                    orphans.append(source)
+    for source in orphans:
+        for suffix in ENCODINGS.values():
+            source.with_name(source.name + suffix).unlink(missing_ok=True)
+
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    with manifest_path.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def _quality(params: list[str]) -> float:
+    for param in params:
+        key, _, value = param.partition("=")
+        if key.strip() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def precompressed(path: Path, accept_encoding: str) -> tuple[Path, Optional[str]]:
+    # the best variant of `path` that the client accepts, with its Content-Encoding, or `path` itself; a variant
+    # is only served when it is newer than `path`, so one left from before `path` was rewritten is ignored
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, *params = part.split(";")
+        if _quality(params) > 0:
+            accepted.add(name.strip().lower())
+    for encoding, suffix in ENCODINGS.items():
+        variant = path.with_name(path.name + suffix)
+        if encoding in accepted and variant.exists() and variant.stat().st_mtime_ns > path.stat().st_mtime_ns:
+            return variant, encoding
+    return path, None
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python artifacts.py DIRECTORY: compress every JSON file of DIRECTORY, with DIRECTORY/compressed.json
+    for directory in map(Path, sys.argv[1:]):
+        compress_artifacts(sorted(directory.glob("*.json")), directory / COMPRESSED_MANIFEST)
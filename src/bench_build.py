@@ -0,0 +1,452 @@
+import io
+import json
+import os
+import random
+import time
+from collections import deque
+from contextlib import redirect_stdout
+from copy import deepcopy
+from typing import Callable
+
+from build_abstract import resolve_ass
+from build_json import (
+    BuildWarning,
+    Replacements,
+    component_set,
+    custom_dump,
+    decompose_ids,
+    get_is_closure,
+    get_new_variants,
+    get_ob,
+    get_replacements,
+    get_variants,
+    group_by_char,
+    parse_lines,
+    parse_ob_line,
+    read_txt,
+    to_repr,
+)
+from ids import canonical_str
+
+SIZES = (12_500, 25_000, 50_000, 100_000)
+QUADRATIC_SIZES = (1_000, 2_000, 4_000, 8_000)
+OPERATORS = "⿰⿱⿵⿸⿻"
+
+
+def synthetic_entries(size: int, seed: int = 0) -> list[dict]:
+    # `parse_dict`-like entries over CJK Ext. B codepoints: mostly one IDS per character, with some characters
+    # declared equal to another, marked X, or given several lines
+    rnd = random.Random(seed)
+    chars = [chr(0x20000 + i) for i in range(int(size / 1.2))]
+    result = []
+    while len(result) < size:
+        char = rnd.choice(chars)
+        kind = rnd.random()
+        if kind < 0.8:
+            result.append({"char": char, "ids": to_repr(rnd.choice(OPERATORS) + rnd.choice(chars) + rnd.choice(chars))})
+        elif kind < 0.95:
+            result.append({"char": char, "is": rnd.choice(chars)})
+        else:
+            result.append({"char": char, "x": True})
+    return result
+
+
+def get_replacements_scan(ENTRIES: list[dict], only_is: bool) -> dict:
+    # reference copy of the previous implementation, which scans all entries for every entry
+    result = {}
+    for entry in ENTRIES:
+        if not entry.get("char"):
+            continue
+        char_repr = to_repr(entry["char"])
+        if entry.get("x") is True:
+            result[char_repr] = "[X]"
+            continue
+        is_entry = [e for e in ENTRIES if e.get("is") and e.get("char") == entry["char"]]
+        ids_entry = [e for e in ENTRIES if e.get("ids") and e.get("char") == entry["char"]]
+        if len(is_entry) == 1 and len(ids_entry) == 0:
+            result[char_repr] = to_repr(is_entry[0]["is"])
+            continue
+        if not only_is:
+            if len(ids_entry) == 1:
+                result[char_repr] = ids_entry[0]["ids"]
+                continue
+    return result
+
+
+def replacements_scan(entries: list[dict]) -> tuple[dict, dict]:
+    return get_replacements_scan(entries, only_is=True), get_replacements_scan(entries, only_is=False)
+
+
+def replacements_grouped(entries: list[dict]) -> tuple[dict, dict]:
+    groups = group_by_char(entries)
+    return get_replacements(entries, only_is=True, GROUPS=groups), get_replacements(entries, only_is=False, GROUPS=groups)
+
+
+def compare(
+    name: str,
+    old: tuple[str, Callable],
+    new: tuple[str, Callable],
+    inputs: Callable[[int], tuple],
+    sizes: tuple[int, ...],
+    old_sizes: tuple[int, ...] = QUADRATIC_SIZES,
+) -> None:
+    # times the reference `old` and its replacement `new` on `inputs(size)` for each size, `old` only on `old_sizes`,
+    # where `new` must also give the same result; `name` is what a size counts
+    def timed(builder: tuple[str, Callable], args: tuple, size: int):
+        label, build = builder
+        begin = time.perf_counter()
+        result = build(*args)
+        seconds = time.perf_counter() - begin
+        print(f"{label:<10}{size:>9}{seconds:>10.3f}{seconds / size * 1e6:>10.2f}")
+        return result
+
+    print(f"{'builder':<10}{'size':>9}{'seconds':>10}{'us/' + name:>10}")
+    for size in sizes:
+        args = inputs(size)
+        expected = timed(old, args, size) if size in old_sizes else None
+        result = timed(new, args, size)
+        if size in old_sizes:
+            assert result == expected, (new[0], size)
+
+
+def bench_replacements() -> None:
+    compare(
+        "entry",
+        ("scan", replacements_scan),
+        ("grouped", replacements_grouped),
+        lambda size: (synthetic_entries(size),),
+        QUADRATIC_SIZES + SIZES,
+    )
+
+
+def synthetic_ob(size: int, seed: int = 0) -> list[str]:
+    # `ob.txt`-like lines: glyph number, glyph, IDS, reconstructed IDS and comment, about four glyphs per IDS
+    rnd = random.Random(seed)
+    chars = [chr(0x4E00 + i) for i in range(max(int(size**0.5), 2))]
+    lines = []
+    for number in range(size):
+        ids = rnd.choice(OPERATORS) + rnd.choice(chars) + rnd.choice(chars)
+        lines.append(f"{number:05d}\t{rnd.choice(chars)}\t{ids}\t\t\n")
+    return lines
+
+
+def get_ob_scan(lines: list[str]) -> dict:
+    # reference copy of the previous grouping, which rescans all lines for every distinct IDS
+    line_dicts = [parse_ob_line(Replacements(), line) for line in lines]
+    ids_list = []
+    for item in line_dicts:
+        if "ids" in item:
+            if item["ids"] not in ids_list:
+                ids_list.append(item["ids"])
+    result = {}
+    for ids in ids_list:
+        chars = [item["ob"] + item["code"] for item in line_dicts if item["ids"] == ids]
+        result[ids] = chars[0] + "@" + "".join(chars[1:])
+    return result
+
+
+def ob_inputs(size: int) -> tuple[list[str], set[str]]:
+    # the lines with the component set `txt_to_json` checks them against: the components of as many entries, plus
+    # one in twenty of the glyphs' components, so that some lines are reported
+    lines = synthetic_ob(size)
+    all_ids = component_set(entry["ids"] for entry in synthetic_entries(size) if "ids" in entry)
+    return lines, all_ids | {chr(0x4E00 + i) for i in range(0, max(int(size**0.5), 2), 20)}
+
+
+def get_ob_checked(lines: list[str], all_ids: set[str]) -> list[tuple[str, str]]:
+    violations: list[BuildWarning] = []
+    result = list(get_ob(Replacements(), all_ids, iter(lines), violations).items())
+    assert violations
+    return result
+
+
+def bench_ob() -> None:
+    compare(
+        "line",
+        ("scan", lambda lines, all_ids: list(get_ob_scan(lines).items())),
+        ("grouped", get_ob_checked),
+        ob_inputs,
+        QUADRATIC_SIZES + SIZES,
+    )
+
+
+def bench_parse(copies: int = 10) -> None:
+    # the abstract input repeated `copies` times, parsed with 1, 2, 4, … processes up to the number of cores
+    lines = list(read_txt()) * copies
+    reference = parse_lines(lines)
+    jobs = 1
+    print(f"{'jobs':<6}{'lines':>9}{'seconds':>10}")
+    while jobs <= (os.cpu_count() or 1):
+        canonical_str.cache_clear()
+        begin = time.perf_counter()
+        entries = parse_lines(lines, jobs)
+        seconds = time.perf_counter() - begin
+        assert entries == reference
+        print(f"{jobs:<6}{len(lines):>9}{seconds:>10.3f}")
+        jobs *= 2
+
+
+def synthetic_ass(size: int, seed: int = 0) -> dict[str, list[str]]:
+    # `parse_ass_dict_from_yamls`-like values that refer to keys defined later, so that the fixpoint needs one pass
+    # per level of nesting: IDS over keys and leaves, `=` aliases and terminal shapes `[k]`
+    rnd = random.Random(seed)
+    keys = [chr(0x20000 + i) for i in range(size)]
+    leaves = [chr(0x4E00 + i) for i in range(1000)]
+    result = {}
+    for i, key in enumerate(keys):
+        later = keys[i + 1 : i + 50]
+        kind = rnd.random()
+        if kind < 0.7 and later:
+            result[key] = [rnd.choice(OPERATORS)] + [rnd.choice(later) if rnd.random() < 0.3 else rnd.choice(leaves) for _ in range(2)]
+        elif kind < 0.9 and later:
+            result[key] = ["=", rnd.choice(later)]
+        else:
+            result[key] = [key]
+    return result
+
+
+def parse_ass_dict_fixpoint(ass_dict: dict[str, list[str]]) -> dict[str, list[str]]:
+    # reference copy of the previous `AbstractBuilder.parse_ass_dict`, which re-expands every value until none changes
+    while True:
+        temp_ass_dict = deepcopy(ass_dict)
+        for key, val in ass_dict.items():
+            if val[0] == "=":
+                ass_dict[key] = val[1:]
+            else:
+                new_val = []
+                for index in range(len(val)):
+                    if val[index] == "=":
+                        continue
+                    if val[index] in ass_dict.keys():
+                        new_val += ass_dict[val[index]]
+                    else:
+                        new_val.append(val[index])
+                    ass_dict[key] = new_val
+        if temp_ass_dict == ass_dict:
+            return ass_dict
+
+
+def bench_ass() -> None:
+    # the fixpoint rewrites its argument, so it gets a copy
+    compare(
+        "key",
+        ("fixpoint", lambda ass_dict: parse_ass_dict_fixpoint(deepcopy(ass_dict))),
+        ("ordered", lambda ass_dict: resolve_ass(ass_dict)[0]),
+        lambda size: (synthetic_ass(size),),
+        QUADRATIC_SIZES + SIZES,
+    )
+
+
+def synthetic_document(size: int, seed: int = 0, depth: int = 3):
+    # nested dicts, lists and tuples of `size` items at most per level, with the non-string keys and the key
+    # collisions (`1` and `"1"`) that `custom_dump` has to spell and merge as `json` does
+    rnd = random.Random(seed)
+
+    def value(level: int):
+        kind = rnd.random() if level else rnd.random() * 0.4
+        if level < depth and kind < 0.2:
+            return {rnd.choice(["a", "1", 1, 1.5, True, False, None, "null", chr(0x4E00 + rnd.randrange(50))]): value(level + 1) for _ in range(rnd.randrange(size))}
+        if level < depth and kind < 0.4:
+            items = [value(level + 1) for _ in range(rnd.randrange(size))]
+            return tuple(items) if rnd.random() < 0.3 else items
+        return rnd.choice([0, -1, 2.5, True, False, None, "", "字\n\"", chr(0x20000 + rnd.randrange(50))])
+
+    return value(0)
+
+
+def custom_dump_roundtrip(obj, indent=2):
+    # reference copy of the previous `custom_dump`, which normalized `obj` through a `json` round trip and built
+    # the output as nested strings
+    compact_json = json.dumps(obj, separators=(",", ":"), indent=indent, ensure_ascii=False)
+    parsed = json.loads(compact_json)
+
+    def encode_with_condition(o):
+        if isinstance(o, dict):
+            if len(o) >= 10:
+                items = []
+                for k, v in o.items():
+                    k_str = json.dumps(k, ensure_ascii=False)
+                    v_str = encode_with_condition(v)
+                    items.append(f"{' ' * indent}{k_str}: {v_str}")
+                return "{\n" + ",\n".join(items) + "\n}"
+            else:
+                items = []
+                for k, v in o.items():
+                    k_str = json.dumps(k, ensure_ascii=False)
+                    v_str = encode_with_condition(v)
+                    items.append(f"{k_str}: {v_str}")
+                return "{" + ", ".join(items) + "}"
+        elif isinstance(o, list):
+            if len(o) >= 10:
+                items = []
+                for item in o:
+                    items.append(" " * indent + encode_with_condition(item))
+                return "[\n" + ",\n".join(items) + "\n]"
+            else:
+                items = []
+                for item in o:
+                    items.append(encode_with_condition(item))
+                return "[" + ", ".join(items) + "]"
+        else:
+            return json.dumps(o, ensure_ascii=False)
+
+    return encode_with_condition(parsed)
+
+
+def bench_dump(checks: int = 3000) -> None:
+    # `checks` random documents must encode as the reference does, then both encode documents of growing size
+    for seed in range(checks):
+        document = synthetic_document(15, seed)
+        assert custom_dump(document) == custom_dump_roundtrip(document), seed
+    compare(
+        "entry",
+        ("roundtrip", custom_dump_roundtrip),
+        ("streaming", custom_dump),
+        lambda size: ({"entries": [synthetic_document(8, seed, depth=2) for seed in range(size)]},),
+        SIZES,
+        SIZES,
+    )
+
+
+def synthetic_is_graph(size: int, seed: int = 0, density: float = 0.5) -> dict[str, set[str]]:
+    # `get_is_graph`-like graphs: a character "is" one or two nearby characters, mostly later ones, so that chains
+    # and trees form, with some edges back that close cycles and self-loops; `density` is the share of characters
+    # with edges, and the reachable sets grow long as it nears 1
+    rnd = random.Random(seed)
+    chars = [chr(0x20000 + i) for i in range(size)]
+    graph: dict[str, set[str]] = {}
+    for i, char in enumerate(chars):
+        if rnd.random() < density:
+            graph[char] = {rnd.choice(chars[i + 1 : i + 20] or chars) for _ in range(rnd.randint(1, 2))}
+            if rnd.random() < 0.05:
+                graph[char].add(rnd.choice(chars[max(i - 20, 0) : i + 1]))
+    return graph
+
+
+def find_nodes_reachable_to(graph: dict[str, set[str]], target: str) -> set[str]:
+    # reference copy of the previous `is` closure, one breadth-first search per key
+    if target not in graph:
+        return set()
+
+    visited = set()
+    queue = deque()
+
+    if target in graph:
+        queue.extend(graph[target])
+
+    while queue:
+        current = queue.popleft()
+        if current not in visited:
+            visited.add(current)
+            if current in graph:
+                for neighbor in graph[current]:
+                    if neighbor not in visited:
+                        queue.append(neighbor)
+    return visited
+
+
+def is_closure_bfs(graph: dict[str, set[str]]) -> dict[str, str]:
+    # as `txt_to_json` used it, sorted since the order of a set is arbitrary
+    return {b: "".join(sorted(find_nodes_reachable_to(graph, b))) for b in graph}
+
+
+def is_closure_scc(graph: dict[str, set[str]]) -> dict[str, str]:
+    closure, cycles = get_is_closure(graph)
+    for cycle in cycles:
+        assert cycle[0] == cycle[-1] and all(b in graph.get(a, ()) for a, b in zip(cycle, cycle[1:])), cycle
+    return closure
+
+
+def bench_is_closure(checks: int = 3000) -> None:
+    # `checks` random graphs of any density must close as the reference does, then both close sparse graphs of growing
+    # size; dense graphs are left out of the timing, as their closures are quadratic in size for both
+    rnd = random.Random(0)
+    for seed in range(checks):
+        graph = synthetic_is_graph(rnd.randint(1, 60), seed, rnd.random())
+        assert is_closure_scc(graph) == is_closure_bfs(graph), seed
+    compare(
+        "char",
+        ("bfs", is_closure_bfs),
+        ("closure", is_closure_scc),
+        lambda size: (synthetic_is_graph(size),),
+        QUADRATIC_SIZES + SIZES,
+        QUADRATIC_SIZES + SIZES,
+    )
+
+
+def synthetic_variant_entries(size: int, seed: int = 0) -> tuple[list[dict], dict[str, str]]:
+    # entries whose IDS come from a small pool over the characters themselves, so that characters share shapes and
+    # occur in their own shapes, and an `is` closure over the same characters
+    rnd = random.Random(seed)
+    chars = [chr(0x20000 + i) for i in range(max(size // 4, 2))]
+    pool = [to_repr(rnd.choice(OPERATORS) + rnd.choice(chars) + rnd.choice(chars)) for _ in range(max(size // 3, 1))]
+    entries = [{"char": rnd.choice(chars), "ids": rnd.choice(pool)} for _ in range(size)]
+    is_relation = {char: "".join(sorted(set(rnd.sample(chars, rnd.randint(0, min(3, len(chars))))))) for char in chars if rnd.random() < 0.3}
+    return entries, is_relation
+
+
+def get_variants_str(ENTRIES: list[dict], IS_RELATION: dict, REPLACEMENTS: dict) -> dict:
+    # reference copy of the previous `get_variants`, which kept characters and variants as strings
+    result = {}
+    for entry in ENTRIES:
+        if "ids" in entry:
+            ids_repr = entry["ids"]
+            ids_repr = decompose_ids(REPLACEMENTS, ids_repr)
+
+            chars_str = result.setdefault(ids_repr, ["", ""])
+            if entry["char"] not in chars_str[0]:
+                chars_str[0] += entry["char"]
+            if entry["char"] in IS_RELATION:
+                for c in IS_RELATION[entry["char"]]:
+                    if c not in chars_str[1]:
+                        chars_str[1] += c
+    return result
+
+
+def get_new_variants_str(VARIANTS: dict) -> dict:
+    # reference copy of the previous `get_new_variants`, which printed its warnings
+    result = {}
+    ids_repr_sorted = sorted(VARIANTS.keys())
+    for ids_repr in ids_repr_sorted:
+        if len(VARIANTS[ids_repr][0]) > 1:
+            for variant in VARIANTS[ids_repr][0]:
+                if variant not in ids_repr:
+                    VARIANTS[ids_repr][0] = "".join(v for v in VARIANTS[ids_repr][0] if v != variant)
+                    if variant not in VARIANTS[ids_repr][1]:
+                        VARIANTS[ids_repr][1] += variant
+        result[ids_repr] = VARIANTS[ids_repr][0] + "@" + "".join(sorted(VARIANTS[ids_repr][1]))
+        if len(VARIANTS[ids_repr][0]) < 1:
+            print(f"Warning: No characters for {ids_repr}: {''.join(sorted(VARIANTS[ids_repr][1]))}")
+        if len(VARIANTS[ids_repr][0]) > 1:
+            print(f"Warning: Multiple characters for {ids_repr}: {VARIANTS[ids_repr][0]}")
+    return result
+
+
+def variants_str(entries: list[dict], is_relation: dict[str, str]) -> tuple[dict, list[str]]:
+    out = io.StringIO()
+    with redirect_stdout(out):
+        result = get_new_variants_str(get_variants_str(entries, is_relation, Replacements()))
+    return result, out.getvalue().splitlines()
+
+
+def variants_sets(entries: list[dict], is_relation: dict[str, str]) -> tuple[dict, list[str]]:
+    warnings: list[BuildWarning] = []
+    result = get_new_variants(get_variants(entries, is_relation, Replacements()), warnings)
+    return result, [f"Warning: {warning}" for warning in warnings]
+
+
+def bench_variants(checks: int = 3000) -> None:
+    # `checks` random entry lists must give the reference's shapes and warnings, then both group lists of growing size
+    rnd = random.Random(0)
+    for seed in range(checks):
+        entries, is_relation = synthetic_variant_entries(rnd.randint(1, 60), seed)
+        assert variants_sets(entries, is_relation) == variants_str(entries, is_relation), seed
+    compare("entry", ("strings", variants_str), ("sets", variants_sets), synthetic_variant_entries, SIZES, SIZES)
+
+
+if __name__ == "__main__":
+    import sys
+
+    benches = {"replacements": bench_replacements, "ob": bench_ob, "parse": bench_parse, "ass": bench_ass, "dump": bench_dump, "closure": bench_is_closure, "variants": bench_variants}
+    for name in sys.argv[1:] or benches:
+        benches[name]()
@@ -0,0 +1,254 @@
+import gc
+import random
+import re
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+from build_initial import ids_filter
+from ids import IDC, IDS, Char, CompactIDS, CompactIDSList, IDSSyntaxError, SubtreeTable, tokenize_many
+
+REPO_DIR = Path(__file__).parent.parent
+DATA_DIR = REPO_DIR / "backend" / "data"
+TXT_DIR = REPO_DIR / "input"
+
+
+def load_ids_lv2() -> list[str]:
+    result = []
+    with (DATA_DIR / "ids_lv2.txt").open("r", encoding="utf-8") as f:
+        for line in f:
+            for idses in line.strip().split("\t")[1:]:
+                result += [re.sub(ids_filter, "", ids) for ids in idses.split(";")]
+    return [ids for ids in result if ids]
+
+
+def load_abstract() -> list[str]:
+    result = []
+    for file_path in sorted(TXT_DIR.glob("abstract_*.txt")):
+        with file_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                char, src_one, src_two = (line.strip().split("\t") + [""] * 3)[:3]
+                if src_one.startswith("*"):
+                    src_one = char + "(" + src_one.removeprefix("*") + ")"
+                result += [src for src in (src_one, src_two) if src and src != "X" and src[0] not in "=*"]
+    return result
+
+
+def parse_anytree(lines: list[str]) -> list[IDS]:
+    result = []
+    for line in lines:
+        try:
+            result.append(IDS.from_str(line))
+        except ValueError:
+            pass
+    return result
+
+
+def parse_compact(lines: list[str]) -> list[CompactIDS]:
+    result = []
+    for line in lines:
+        try:
+            result.append(CompactIDS.from_str(line))
+        except ValueError:
+            pass
+    return result
+
+
+def parse_compact_list(lines: list[str]) -> CompactIDSList:
+    result = CompactIDSList()
+    for line in lines:
+        try:
+            result.append(line)
+        except ValueError:
+            pass
+    return result
+
+
+# the recursive parser `IDS.from_str` used before `tokenize`, kept as the reference for `bench_parse_many`
+def from_str_recursive(ids: str) -> IDS:
+    def parse(index: int):
+        while index < len(ids) and ids[index].isspace():
+            index += 1
+        if index >= len(ids):
+            raise ValueError(f"Unexpected end of string: {ids}")
+        if ids[index] in IDC.ALL:
+            operator = ids[index]
+            index += 1
+            operands = []
+            for _ in range(IDC.arity(operator)):
+                while index < len(ids) and ids[index].isspace():
+                    index += 1
+                node, index = parse(index)
+                operands.append(node)
+            return IDS(operator, *operands), index
+        c = ids[index]
+        if c in "()":
+            raise ValueError(f"Unexpected character: {c}")
+        index += 1
+        if index < len(ids) and ids[index] == "(":
+            index += 1
+            if index >= len(ids):
+                raise ValueError("Unexpected end of string after '('")
+            c2 = ids[index]
+            if c2 in IDC.ALL or c2 in "()":
+                raise ValueError(f"Unexpected character in parentheses: {c2}")
+            index += 1
+            if index >= len(ids) or ids[index] != ")":
+                raise ValueError("Expected ')'")
+            return IDS(Char(f"{c}({c2})")), index + 1
+        return IDS(Char(c)), index
+
+    return parse(0)[0]
+
+
+def parse_recursive(lines: list[str]) -> list[IDS]:
+    result = []
+    for line in lines:
+        try:
+            result.append(from_str_recursive(line))
+        except ValueError:
+            pass
+    return result
+
+
+def parse_many_compact(lines: list[str]) -> list[CompactIDS]:
+    errors: list[IDSSyntaxError] = []
+    return [ids for ids in CompactIDS.parse_many(lines, errors) if ids is not None]
+
+
+def measure(parse: Callable, lines: list[str]) -> tuple[int, float, int]:
+    gc.collect()
+    begin = time.perf_counter()
+    parsed = parse(lines)
+    elapsed = time.perf_counter() - begin
+    del parsed
+
+    gc.collect()
+    tracemalloc.start()
+    parsed = parse(lines)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(parsed), elapsed, retained
+
+
+def bench_compact() -> None:
+    corpora = {"ids_lv2": load_ids_lv2(), "abstract": load_abstract()}
+    parsers = {"anytree": parse_anytree, "compact": parse_compact, "compact_list": parse_compact_list}
+    print(f"{'corpus':<10}{'parser':<14}{'trees':>8}{'seconds':>10}{'lines/s':>10}{'MiB':>9}")
+    for corpus, lines in corpora.items():
+        for name, parse in parsers.items():
+            count, elapsed, retained = measure(parse, lines)
+            print(f"{corpus:<10}{name:<14}{count:>8}{elapsed:>10.3f}{len(lines) / elapsed:>10.0f}{retained / 2**20:>9.2f}")
+
+
+def bench_parse_many() -> None:
+    lines = load_ids_lv2() + load_abstract()
+    errors: list[IDSSyntaxError] = []
+    for _ in CompactIDS.parse_many(lines, errors):
+        pass
+    print(f"{len(lines)} lines, {len(errors)} rejected")
+    for error in errors[:5]:
+        print(f"  {error}")
+
+    parsers = {"recursive": parse_recursive, "tokenize": parse_anytree, "parse_many_compact": parse_many_compact}
+    print(f"{'parser':<20}{'trees':>8}{'seconds':>10}{'lines/s':>10}{'MiB':>9}")
+    for name, parse in parsers.items():
+        count, elapsed, retained = measure(parse, lines)
+        print(f"{name:<20}{count:>8}{elapsed:>10.3f}{len(lines) / elapsed:>10.0f}{retained / 2**20:>9.2f}")
+
+
+def intern_corpus(lines: list[str]) -> tuple[SubtreeTable, list[int]]:
+    table = SubtreeTable()
+    return table, [table.intern_tokens(tokens) for tokens in tokenize_many(lines, []) if tokens]
+
+
+def bench_intern() -> None:
+    lines = load_ids_lv2() + load_abstract()
+    table, uids = intern_corpus(lines)
+    nodes = sum(1 for tokens in tokenize_many(lines, []) for _ in tokens)
+    print(f"{len(uids)} trees, {nodes} nodes, {len(table)} distinct subtrees, {len(set(uids))} distinct trees")
+
+    count, elapsed, retained = measure(parse_anytree, lines)
+    print(f"{'anytree':<10}{elapsed:>8.3f} s{retained / 2**20:>9.2f} MiB")
+    count, elapsed, retained = measure(intern_corpus, lines)
+    print(f"{'interned':<10}{elapsed:>8.3f} s{retained / 2**20:>9.2f} MiB")
+
+    trees = parse_anytree(lines)
+    for name, key in (("repr", repr), ("uid", hash)):
+        for tree in trees:
+            key(tree)  # warm the uid cache so both rows time grouping only
+        gc.collect()
+        gc.disable()
+        begin = time.perf_counter()
+        groups: dict = {}
+        for tree in trees:
+            groups.setdefault(key(tree), []).append(tree)
+        gc.enable()
+        print(f"group by {name:<5}{time.perf_counter() - begin:>8.3f} s, {len(groups)} groups")
+
+
+# mutations through every path that can reach a cached node must be visible in repr, uid, == and hash
+def check_mutation() -> None:
+    def same(a: IDS, b: IDS) -> bool:
+        return repr(a) == repr(b) and a.uid == b.uid and a == b and hash(a) == hash(b)
+
+    char = Char("A")
+    leaf = IDS(char)
+    tree = IDS("⿰", leaf, IDS("B"))
+    assert same(tree, IDS("⿰AB"))
+    char.shape = "C"
+    assert same(tree, IDS("⿰CB")) and not same(tree, IDS("⿰AB"))
+
+    inner = IDS("⿱AB")
+    wrapper = IDS(inner)
+    outer = IDS("⿰", wrapper, IDS("D"))
+    assert same(wrapper, IDS("⿱AB")) and same(outer, IDS("⿰⿱ABD"))
+    inner.operator = "⿰"
+    assert same(wrapper, IDS("⿰AB")) and same(outer, IDS("⿰⿰ABD"))
+    inner.children[0].char.shape = "E"
+    assert same(wrapper, IDS("⿰EB")) and same(outer, IDS("⿰⿰EBD"))
+    inner.children[1].parent = None
+    inner.children = [IDS("F"), IDS("G")]
+    assert same(outer, IDS("⿰⿰FGD"))
+
+    wrapper.char = IDS("H")
+    inner.operator = "⿱"
+    assert same(outer, IDS("⿰HD")) and inner._wrapper is None
+    print("mutation: ok")
+
+
+def random_ids(rnd: random.Random, depth: int) -> str:
+    if depth == 0 or rnd.random() < 0.3:
+        return rnd.choice("AB")
+    operator = rnd.choice((IDC.LR, IDC.LL, IDC.UD, IDC.UU, IDC.XX))
+    return operator + "".join(random_ids(rnd, depth - 1) for _ in range(IDC.arity(operator)))
+
+
+# the normal form must be a fixed point, and a key must not depend on which shapes were normalized before it
+def check_normalize(count: int = 20000, seed: int = 0) -> None:
+    rnd = random.Random(seed)
+    shapes = ["⿲⿲ABBBB", "⿰A⿰B⿲BBB", "⿲AB⿲BBB", "⿰⿲AAAB", "⿱A⿱AA", "⿰A⿱AA", "⿰⿱A⿱AAB"]
+    shapes += [random_ids(rnd, 4) for _ in range(count)]
+
+    table = SubtreeTable()
+    normals = {}
+    for shape in shapes:
+        normal = table.normalize(table.intern_str(shape))
+        assert table.normalize(normal) == normal, (shape, table.repr(normal), table.repr(table.normalize(normal)))
+        normals[shape] = table.repr(normal)
+
+    for _ in range(5):
+        rnd.shuffle(shapes)
+        table = SubtreeTable()
+        for shape in shapes:
+            assert table.repr(table.normalize(table.intern_str(shape))) == normals[shape], shape
+    print(f"normalize: ok, {len(normals)} shapes, {len(set(normals.values()))} normal forms")
+
+
+if __name__ == "__main__":
+    import sys
+
+    benches = {"compact": bench_compact, "parse_many": bench_parse_many, "intern": bench_intern, "mutation": check_mutation, "normalize": check_normalize}
+    for name in sys.argv[1:] or benches:
+        benches[name]()
@@ -0,0 +1,327 @@
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterator
+
+import yaml
+
+from build_json import FILE_NAMES
+from profiler import Profiler
+
+REPO_DIR = Path(__file__).parent.parent
+DATA_DIR = REPO_DIR / "backend" / "data"
+TXT_DIR = REPO_DIR / "input"
+BASELINE_FILE = REPO_DIR / "result" / "bench_baseline.json"
+RESULT_NAME = "bench.json"
+PIPELINES = ("json", "abstract", "initial")
+# `initial` dumps the whole IDS and IES tables as YAML, which takes about a minute at 1x; it runs when asked for
+DEFAULT_PIPELINES = ("json", "abstract")
+SCALES = (1, 10)
+THRESHOLD = 0.25
+# a single run with tracemalloc on varies by a quarter or more; the fastest of a few is stable
+REPEAT = 3
+# `work` is CPU time in units of `calibrate()`, measured by the same process, so that it does not follow the speed
+# of a shared machine, which drifts by a third or more between runs
+METRICS = ("wall", "cpu", "work", "peak_mib")
+# the gated metrics, with the differences below which they are noise whatever the ratio
+NOISE = {"work": 0.5, "peak_mib": 1.0}
+# short stages jitter by more than the threshold even at their fastest, so a stage must also grow by this share of
+# its pipeline's total to count
+NOISE_SHARE = 0.05
+FIRST_CODEPOINT = 0x20000
+REFERENCE_RANGE = range(0x3400, 0x4DBF + 1)
+
+
+def fresh_chars(used: set[str]) -> Iterator[str]:
+    # codepoints from plane 2 upwards that the seed does not use, noncharacters excepted; the pipelines only
+    # compare, sort and encode characters, so whether a codepoint is assigned does not matter
+    for codepoint in range(FIRST_CODEPOINT, sys.maxunicode + 1):
+        char = chr(codepoint)
+        if codepoint & 0xFFFE != 0xFFFE and char not in used:
+            yield char
+
+
+def renamings(heads: list[str], used: set[str], scale: int) -> list[dict[int, str]]:
+    # translation tables of the copies of a seed: copy 0 is the seed itself, every further copy renames the seed's
+    # head characters to fresh codepoints wherever they occur, so that copies keep the seed's relations among
+    # themselves and share only the components that are not heads; there are fewer copies than `scale` when the
+    # codepoints run out
+    fresh = fresh_chars(used)
+    tables: list[dict[int, str]] = [{}]
+    for _ in range(scale - 1):
+        table = {}
+        for head, char in zip(heads, fresh):
+            table[ord(head)] = char
+        if len(table) < len(heads):
+            break
+        tables.append(table)
+    return tables
+
+
+def read_seed(path: Path) -> list[str]:
+    with path.open("r", encoding="utf-8") as f:
+        return [line.removesuffix("\n") for line in f if line.strip()]
+
+
+def write_copies(path: Path, lines: list[str], tables: list[dict[int, str]]) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        for table in tables:
+            for line in lines:
+                f.write(line.translate(table) + "\n")
+    return len(lines) * len(tables)
+
+
+def seed_ob() -> list[str]:
+    # `ob.txt` lines rebuilt from the backend's OB data
+    lines = []
+    with (DATA_DIR / "ob.jsonl").open("r", encoding="utf-8") as f:
+        for line in f:
+            ob = json.loads(line)
+            for annotation in ob["annotations"]:
+                if annotation["con"] or annotation["ref"] or annotation["comm"]:
+                    lines.append("\t".join([ob["num"], ob["glyph"], annotation["con"], annotation["ref"], annotation["comm"]]).rstrip())
+    return lines
+
+
+def _load_data(name: str):
+    with (DATA_DIR / name).open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def generate_json(tree: Path, scale: int) -> dict[str, int]:
+    # `input/` of `build_json`: the abstract files, extra and OB are copied, papers and geta are taken as they are
+    abstracts = {name: read_seed(TXT_DIR / f"abstract_{name}.txt") for name in FILE_NAMES}
+    extra = [f"{e['con']}\t{e['recon']}\t{e['comm']}" for e in _load_data("extra.json")["extra"]]
+    ob = seed_ob()
+    heads = list(dict.fromkeys(line.split("\t")[0] for lines in abstracts.values() for line in lines))
+    used = {char for lines in [*abstracts.values(), extra, ob] for line in lines for char in line}
+    tables = renamings(heads, used, scale)
+
+    input_dir = tree / "input"
+    sizes = {"copies": len(tables)}
+    sizes["abstract"] = sum(write_copies(input_dir / f"abstract_{name}.txt", lines, tables) for name, lines in abstracts.items())
+    sizes["extra"] = write_copies(input_dir / "extra.txt", extra, tables)
+    sizes["ob"] = write_copies(input_dir / "ob.txt", ob, tables)
+    papers = [f"{p['id']}\t{p['raw_title']}\t{p['url']}" for p in _load_data("papers.json")["papers"]]
+    write_copies(input_dir / "paper.txt", papers, [{}])
+    write_copies(input_dir / "geta.txt", [f"{g['key']}\t{g['description']}" for g in _load_data("geta.json")["geta"]], [{}])
+    return sizes
+
+
+def generate_abstract(tree: Path, scale: int) -> dict[str, int]:
+    # `input/abstract_shape_*.yaml` of `build_abstract`, made from the copied abstract files
+    sizes = generate_json(tree, scale)
+    for name in FILE_NAMES:
+        shapes = {}
+        for line in read_seed(tree / "input" / f"abstract_{name}.txt"):
+            char, src_one = (line.split("\t") + [""])[:2]
+            if src_one:
+                shapes[char] = src_one if not src_one.startswith("*") else char + "(" + src_one.removeprefix("*") + ")"
+        with (tree / "input" / f"abstract_shape_{name}.yaml").open("w", encoding="utf-8") as f:
+            yaml.dump(shapes, f, indent=4, allow_unicode=True)
+    return {"copies": sizes["copies"], "abstract": sizes["abstract"]}
+
+
+def generate_initial(tree: Path, scale: int) -> dict[str, int]:
+    # `data/` of `build_initial`: IDS and IES are copied, the unification and ambiguity tables are taken as they are
+    ids = read_seed(DATA_DIR / "ids_lv2.txt")
+    ies = read_seed(DATA_DIR / "ies20240314.txt")
+    heads = list(dict.fromkeys(line.split("\t")[0] for line in ids + ies))
+    used = {char for line in ids + ies for char in line}
+    tables = renamings(heads, used, scale)
+
+    data_dir = tree / "data"
+    sizes = {"copies": len(tables)}
+    sizes["ids"] = write_copies(data_dir / "ids_lv2.txt", ids, tables)
+    sizes["ies"] = write_copies(data_dir / "ies20240314.txt", ies, tables)
+    for name in ("unify_eiso", "similar_fei", "ambiguous"):
+        with (data_dir / f"{name}.yaml").open("w", encoding="utf-8") as f:
+            yaml.dump(_load_data(f"{name}.json"), f, indent=4, allow_unicode=True)
+    return sizes
+
+
+GENERATORS = {"json": generate_json, "abstract": generate_abstract, "initial": generate_initial}
+
+
+def run_json(tree: Path, profiler: Profiler) -> None:
+    import build_json
+
+    build_json.TXT_DIR = tree / "input"
+    build_json.JSON_DIR = tree / "assets" / "abstract.json"
+    build_json.STAT_FILE = tree / "result" / "statistics.tsv"
+    build_json.WARNINGS_FILE = tree / "result" / "warnings.json"
+    build_json.get_substituter.cache_clear()
+    build_json.txt_to_json(profiler=profiler)
+
+
+def run_abstract(tree: Path, profiler: Profiler) -> None:
+    from build_abstract import AbstractBuilder
+
+    os.chdir(tree)
+    os.makedirs("abstract", exist_ok=True)
+    os.makedirs("result", exist_ok=True)
+    builder = AbstractBuilder.__new__(AbstractBuilder)
+    with profiler.stage("parse_yamls") as stage:
+        parsed = builder.parse_ass_dict_from_yamls([f"input/abstract_shape_{name}.yaml" for name in FILE_NAMES])
+        stage.count = len(parsed)
+    with profiler.stage("parse_ass_dict") as stage:
+        parsed = builder.parse_ass_dict(parsed)
+        stage.count = len(parsed)
+    with profiler.stage("build_as_dict") as stage:
+        as_dict = builder.build_as_dict(parsed)
+        stage.count = len(as_dict)
+    with profiler.stage("build_indexed") as stage:
+        stage.count = len(builder.build_indexed_ass_dict(parsed, as_dict))
+    with profiler.stage("build_unification"):
+        builder.build_unification(parsed)
+
+
+def run_initial(tree: Path, profiler: Profiler) -> None:
+    from build_initial import InitialBuilder, _load, _merge
+
+    os.chdir(tree)
+    os.makedirs("initial", exist_ok=True)
+    builder = InitialBuilder.__new__(InitialBuilder)
+    with profiler.stage("build_ids_dict") as stage:
+        ids_dict = builder.build_ids_dict("data/ids_lv2.txt")
+        stage.count = len(ids_dict)
+    with profiler.stage("build_cognition") as stage:
+        cog_dict = builder.build_cognition_dict("data/ies20240314.txt")
+        stage.count = len(cog_dict)
+    with profiler.stage("build_reference") as stage:
+        uni_dict = _merge(_load("data/unify_eiso.yaml"), _load("data/similar_fei.yaml"))
+        amb_dict = _load("data/ambiguous.yaml")
+        stage.count = len(builder.build_reference_ass(ids_dict, cog_dict, uni_dict, amb_dict, REFERENCE_RANGE))
+
+
+RUNNERS = {"json": run_json, "abstract": run_abstract, "initial": run_initial}
+
+
+def calibrate(rounds: int = 5) -> float:
+    # CPU seconds of a fixed dict and string workload, the fastest of `rounds`
+    best = float("inf")
+    for _ in range(rounds):
+        begin = time.process_time()
+        table = {}
+        for i in range(200_000):
+            table[i % 1000] = str(i)
+        best = min(best, time.process_time() - begin)
+    return best
+
+
+def child(pipeline: str, tree: Path) -> None:
+    # one pipeline over one generated tree, calibrated before and after; stages are written to `RESULT_NAME` since
+    # the builders print
+    profiler = Profiler()
+    before = calibrate()
+    with contextlib.redirect_stdout(sys.stderr):
+        RUNNERS[pipeline](tree, profiler)
+    profiler.stop()
+    report = profiler.report()
+    report["calibration"] = (before + calibrate()) / 2
+    with (tree / RESULT_NAME).open("w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def run_once(pipeline: str, scale: int) -> tuple[dict[str, int], dict]:
+    # every run gets a fresh tree and a fresh interpreter, so that caches and peak memory do not leak between runs
+    with tempfile.TemporaryDirectory(prefix=f"bench-{pipeline}-{scale}-") as temp:
+        tree = Path(temp)
+        sizes = GENERATORS[pipeline](tree, scale)
+        process = subprocess.run([sys.executable, __file__, "--child", pipeline, str(tree)], capture_output=True, text=True)
+        if process.returncode:
+            raise RuntimeError(f"{pipeline}@{scale} failed:\n{process.stderr[-2000:]}")
+        with (tree / RESULT_NAME).open("r", encoding="utf-8") as f:
+            report = json.load(f)
+    return sizes, report
+
+
+def measure(pipeline: str, scale: int, repeat: int = REPEAT) -> dict:
+    # the minimum of every metric over `repeat` runs
+    stages: dict[str, dict[str, float]] = {}
+    for _ in range(repeat):
+        sizes, report = run_once(pipeline, scale)
+        for stage in [*report["stages"], report["total"]]:
+            stage["work"] = round(stage["cpu"] / report["calibration"], 2)
+            best = stages.setdefault(stage["name"], {metric: stage[metric] for metric in METRICS})
+            for metric in METRICS:
+                best[metric] = min(best[metric], stage[metric])
+    return {"sizes": sizes, "stages": stages}
+
+
+def regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    messages = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        if result["sizes"] != baseline[key]["sizes"]:
+            messages.append(f"{key}: input sizes {result['sizes']} differ from the baseline's {baseline[key]['sizes']}")
+            continue
+        total = baseline[key]["stages"].get("total", {})
+        for name, stage in result["stages"].items():
+            before = baseline[key]["stages"].get(name)
+            if before is None or any(metric not in before for metric in NOISE):
+                continue
+            for metric, noise in NOISE.items():
+                floor = max(noise, NOISE_SHARE * total.get(metric, 0))
+                if stage[metric] > before[metric] * (1 + threshold) and stage[metric] - before[metric] > floor:
+                    messages.append(f"{key} {name}: {metric} {before[metric]} -> {stage[metric]}")
+    return messages
+
+
+def print_result(key: str, result: dict, baseline: dict) -> None:
+    print(f"{key}  " + "  ".join(f"{name}={size}" for name, size in result["sizes"].items()))
+    for name, stage in result["stages"].items():
+        before = baseline.get(key, {}).get("stages", {}).get(name)
+        change = f"{(stage['work'] / before['work'] - 1) * 100:>+8.1f}%" if before and before.get("work") else ""
+        print(f"  {name:<20}{stage['wall']:>9.3f}s{stage['work']:>9.1f}u{stage['peak_mib']:>9.1f}MiB{change}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Time the build pipelines over synthetic inputs of growing size.")
+    parser.add_argument("--pipelines", default=",".join(DEFAULT_PIPELINES), help=f"comma-separated subset of {', '.join(PIPELINES)}")
+    parser.add_argument("--scales", default=",".join(map(str, SCALES)), help="comma-separated multiples of today's input, e.g. 1,10,100")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE, help="stored results to compare with")
+    parser.add_argument("--save", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="relative slow-down or growth that fails the run")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="runs per pipeline and scale, of which the fastest counts")
+    parser.add_argument("--child", nargs=2, metavar=("PIPELINE", "TREE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], Path(args.child[1]))
+        return 0
+
+    baseline = {}
+    if args.baseline.exists():
+        with args.baseline.open("r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = {}
+    for scale in map(int, args.scales.split(",")):
+        for pipeline in args.pipelines.split(","):
+            key = f"{pipeline}@{scale}"
+            results[key] = measure(pipeline, scale, args.repeat)
+            print_result(key, results[key], baseline)
+
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        with args.baseline.open("w", encoding="utf-8") as f:
+            json.dump({**baseline, **results}, f, ensure_ascii=False, indent=2)
+        return 0
+
+    messages = regressions(results, baseline, args.threshold)
+    for message in messages:
+        print(f"Regression: {message}")
+    return 1 if messages else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
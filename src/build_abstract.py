@@ -1,8 +1,9 @@
 import os
-from copy import deepcopy
 
 import yaml
 
+from ids import canonical_key
+
 
 def _unicode(char: str) -> str:
     return "U+" + hex(ord(char)).upper().replace("0X", "")
@@ -12,6 +13,14 @@ def _isshape(string: str) -> bool:
     return (ord(string[0]) < 0x2FF0 or ord(string[0]) > 0x2FFF) and string != "X" and string != "↷"
 
 
+def _canonical_key(value: str):
+    # shapes outside the IDS grammar (e.g. with `↷`) only group with identical strings
+    try:
+        return canonical_key(value)
+    except ValueError:
+        return value
+
+
 def parse_ass(value: str) -> list[str]:
     value_list = list(value)
     parsed_ass = []
@@ -30,6 +39,60 @@ def parse_ass(value: str) -> list[str]:
     return parsed_ass
 
 
+def shape_str(val: list[str]) -> str:
+    # a resolved value as written to the yaml files: shapes in brackets, operators and `X` bare
+    return " ".join("[" + value + "]" if _isshape(value) else value for value in val)
+
+
+def unification_groups(ass_dict: dict[str, list[str]], canonical: bool = False) -> dict[str, list[str]]:
+    # resolved shape -> the characters that share it, keys taken in sorted order as in `result/iterative_ass.yaml`;
+    # with `canonical`, shapes with the same `canonical_key` are merged under the first of them. Shapes with `X` and
+    # shapes of a single character are left out.
+    groups: dict = {}
+    for key in sorted(ass_dict):
+        shape = shape_str(ass_dict[key])
+        groups.setdefault(_canonical_key(shape) if canonical else shape, (shape, []))[1].append(key)
+    return {shape: chars for shape, chars in groups.values() if "X" not in shape and len(chars) > 1}
+
+
+def resolve_ass(ass_dict: dict[str, list[str]]) -> tuple[dict[str, list[str]], list[list[str]]]:
+    # every key is expanded once, after the keys it refers to: `=` marks are dropped and a token that is a key is
+    # replaced by that key's expansion. A reference back to a key that is still being expanded stays a token; unless
+    # it is the key's whole value (`[k]`, a terminal shape), the loop is returned as a cycle `[a, b, ..., a]`.
+    resolved: dict[str, tuple[str, ...]] = {}
+    cycles: list[list[str]] = []
+    for root in ass_dict:
+        if root in resolved:
+            continue
+        stack = [(root, iter(ass_dict[root]), [])]
+        on_stack = {root}
+        while stack:
+            key, tokens, expansion = stack[-1]
+            for token in tokens:
+                if token == "=":
+                    continue
+                if token in resolved:
+                    expansion.extend(resolved[token])
+                elif token not in ass_dict:
+                    expansion.append(token)
+                elif token in on_stack:
+                    if token != key or [val for val in ass_dict[key] if val != "="] != [key]:
+                        path = [frame[0] for frame in stack]
+                        cycles.append(path[path.index(token) :] + [token])
+                    expansion.append(token)
+                else:
+                    stack.append((token, iter(ass_dict[token]), []))
+                    on_stack.add(token)
+                    break
+            else:
+                stack.pop()
+                on_stack.discard(key)
+                resolved[key] = tuple(expansion)
+                if stack:
+                    stack[-1][2].extend(expansion)
+    return {key: list(resolved[key]) for key in ass_dict}, cycles
+
+
 class AbstractBuilder:
     def parse_ass_dict_from_yamls(self, ass_paths: list[str]):
         parsed_ass_dict = {}
@@ -42,52 +105,24 @@ class AbstractBuilder:
 
         # dump yaml
         temp_ass_path = "abstract/ass.yaml"
-        left_brace = ["", "["]
-        right_brace = ["", "]"]
-        temp_parsed_ass_dict = {}
-        for key, val in parsed_ass_dict.items():
-            temp_parsed_val = [left_brace[_isshape(value)] + value + right_brace[_isshape(value)] for value in val]
-            join_parsed_val = " ".join(temp_parsed_val)
-            temp_parsed_ass_dict[key] = join_parsed_val
+        temp_parsed_ass_dict = {key: shape_str(val) for key, val in parsed_ass_dict.items()}
         with open(temp_ass_path, "w", encoding="utf-8") as f_temp:
             yaml.dump(temp_parsed_ass_dict, f_temp, indent=4, allow_unicode=True)
 
         return parsed_ass_dict
 
     def parse_ass_dict(self, ass_dict: dict[str, list[str]]) -> dict[str, list[str]]:
-        while True:
-            temp_ass_dict = deepcopy(ass_dict)
-
-            for key, val in ass_dict.items():
-                if val[0] == "=":
-                    ass_dict[key] = val[1:]
-                else:
-                    new_val = []
-                    for index in range(len(val)):
-                        if val[index] == "=":
-                            continue
-                        if val[index] in ass_dict.keys():
-                            new_val += ass_dict[val[index]]
-                        else:
-                            new_val.append(val[index])
-                        ass_dict[key] = new_val
-
-            if temp_ass_dict == ass_dict:
-                break
+        temp_ass_dict, cycles = resolve_ass(ass_dict)
+        for cycle in cycles:
+            print("Warning: reference cycle " + " -> ".join(cycle))
 
         # dump yaml
         temp_ass_path = "result/iterative_ass.yaml"
-        left_brace = ["", "["]
-        right_brace = ["", "]"]
-        dump_dict = {}
-        for key, val in temp_ass_dict.items():
-            temp_val = [left_brace[_isshape(value)] + value + right_brace[_isshape(value)] for value in val]
-            join_val = " ".join(temp_val)
-            dump_dict[key] = join_val
+        dump_dict = {key: shape_str(val) for key, val in temp_ass_dict.items()}
         with open(temp_ass_path, "w", encoding="utf-8") as f_temp:
             yaml.dump(dump_dict, f_temp, indent=4, allow_unicode=True)
 
-        return ass_dict
+        return temp_ass_dict
 
     def build_as_dict(self, ass_dict: dict[str, list[str]]) -> dict[int, str]:
         as_set = set()
@@ -125,24 +160,14 @@ class AbstractBuilder:
 
         return indexed_dict
 
-    def build_unification(self) -> None:
-        ass_path = "result/iterative_ass.yaml"
-
-        with open(ass_path, "r", encoding="utf-8") as f_ass:
-            ass_dict: dict[str, str] = yaml.load(f_ass, Loader=yaml.FullLoader)
-        parsed_ass_dict = {}
-        for key, val in ass_dict.items():
-            if str(val) not in parsed_ass_dict.keys():
-                parsed_ass_dict[str(val)] = [str(key)]
-            else:
-                parsed_ass_dict[str(val)] += [str(key)]
-        del parsed_ass_dict["X"]
+    def build_unification(self, ass_dict: dict[str, list[str]], canonical: bool = False) -> dict[str, list[str]]:
+        groups = unification_groups(ass_dict, canonical)
 
         temp_unification_path = "result/unification.txt"
         with open(temp_unification_path, "w", encoding="utf-8") as f_temp:
-            for key, val in parsed_ass_dict.items():
-                if "X" not in str(key) and len(val) > 1:
-                    f_temp.write("".join(val) + "\n")
+            for val in groups.values():
+                f_temp.write("".join(val) + "\n")
+        return groups
 
     def __init__(self) -> None:
         if not os.path.exists("abstract/"):
@@ -156,7 +181,7 @@ class AbstractBuilder:
         iteratively_parsed_ass_dict = self.parse_ass_dict(parsed_ass_dict)
         as_dict = self.build_as_dict(iteratively_parsed_ass_dict)
         _ = self.build_indexed_ass_dict(iteratively_parsed_ass_dict, as_dict)
-        self.build_unification()
+        self.build_unification(iteratively_parsed_ass_dict)
 
 
 if __name__ == "__main__":
@@ -3,6 +3,8 @@ import re
 
 import yaml
 
+from corpus import Corpus
+
 ids_filter = r"[-#\(\)\*\,\.\:\;\?\[\]\{\}\^_>0123456789abBcdDfghHijJKlMnNpPqQrsStTuUvVwWxyzZ]"
 cog_filter = r"[\(\)\*？\{\}⇄↻☷⿰⿱⿳⿸0234ABcCgHNoXZ]"
 shape_filter = (
@@ -66,15 +68,13 @@ class InitialBuilder:
         if file_path.endswith(".yaml"):
             ids_dict = _load(file_path)
         elif file_path.endswith(".txt"):
-            with open(file_path, "r", encoding="utf-8") as f_ids:
-                line = f_ids.readline().strip()
-                while line:
-                    char, idses = line.split("\t")[0], line.split("\t")[1:]
-                    list_single_ids = []
-                    for idses in idses:
-                        list_single_ids += idses.split(";")
-                    ids_dict[char] = [re.sub(ids_filter, "", i) for i in list_single_ids]
-                    line = f_ids.readline().strip()
+            corpus = Corpus.open(file_path)
+            for char in corpus:
+                list_single_ids = []
+                for idses in corpus[char][-1]:
+                    list_single_ids += idses.split(";")
+                ids_dict[char] = [re.sub(ids_filter, "", i) for i in list_single_ids]
+            corpus.close()
 
         # dump yaml
         _dump("initial/built_ids.yaml", ids_dict)
@@ -86,16 +86,10 @@ class InitialBuilder:
         if file_path.endswith(".yaml"):
             cog_dict = _load(file_path)
         elif file_path.endswith(".txt"):
-            with open(file_path, "r", encoding="utf-8") as f_cog:
-                line = f_cog.readline().strip()
-                while line:
-                    str_character, str_cognition = line.split("\t")
-                    str_cognition = re.sub(cog_filter, "", str_cognition)
-                    if str_character in cog_dict.keys():
-                        cog_dict[str_character].append(str_cognition)
-                    else:
-                        cog_dict[str_character] = [str_cognition]
-                    line = f_cog.readline().strip()
+            corpus = Corpus.open(file_path)
+            for str_character in corpus:
+                cog_dict[str_character] = [re.sub(cog_filter, "", str_cognition) for (str_cognition,) in corpus[str_character]]
+            corpus.close()
 
         # dump yaml
         _dump("initial/built_cognition.yaml", cog_dict)
@@ -1,47 +1,57 @@
+import io
 import json
 import re
-from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, Optional
 
-from ids import IDS
+from artifacts import COMPRESSED_MANIFEST, compress_artifacts, write_shards
+from ids import SUBTREES, canonical_key, canonical_str
+from profiler import Profiler
+from substitute import BIBLIOGRAPHY, Substituter
 
 REPO_DIR = Path(__file__).parent.parent
 TXT_DIR = REPO_DIR / "input"
 JSON_DIR = REPO_DIR.parent / "kushim-jiang.github.io" / "assets" / "abstract.json"
 STAT_FILE = REPO_DIR / "result" / "statistics.tsv"
+PROFILE_FILE = REPO_DIR / "result" / "profile.json"
+WARNINGS_FILE = REPO_DIR / "result" / "warnings.json"
+SHARD_DIR = JSON_DIR.parent / "abstract"
+PARSE_CHUNK = 500
+COMPONENT = re.compile(r"\[(.*?)\]")
 
 
 FILE_NAMES = ["main", "a", "b", "ci", "gh"]
-BIBLIOGRAPHY = {
-    "“": "「",
-    "”": "」",
-    "‘": "『",
-    "’": "』",
-    "·": "・",
-    "…": "⋯",
-    "SW": "《说文解字》",
-    "GY": "《广韵》",
-    "CY": "《常用漢字表》（日本）",
-    "ZG": "《中国语言资源保护工程汉语方言用字规范》",
-    "JY": "《集韵》",
-    "WS": "《和製漢字の辞典（2014）》",
-    "FY": "《汉语方言大字典》",
-}
-
-PAPERS = {}
-with (TXT_DIR / "paper.txt").open("r", encoding="utf-8") as f:
-    for line in f.readlines():
-        number, name, ref = line.removesuffix("\n").split("\t")
-        PAPERS[number] = f"<a href={ref}>{name}</a>"
+
+
+def load_papers(paper_path: Optional[Path] = None) -> dict[str, str]:
+    paper_path = paper_path or TXT_DIR / "paper.txt"
+    papers = {}
+    if paper_path.exists():
+        with paper_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                number, name, ref = line.removesuffix("\n").split("\t")
+                papers[number] = f"<a href={ref}>{name}</a>"
+    return papers
+
+
+@lru_cache(maxsize=None)
+def get_substituter() -> Substituter:
+    # paper links were rewritten by the bibliography as well, since it used to be applied after them
+    bibliography = Substituter(BIBLIOGRAPHY)
+    papers = {number: bibliography(link) for number, link in load_papers().items()}
+    return Substituter({**BIBLIOGRAPHY, **papers})
 
 
 def replaced(value: str):
-    for old, new in PAPERS.items():
-        value = value.replace(old, new)
-    for old, new in BIBLIOGRAPHY.items():
-        value = value.replace(old, new)
-    return value
+    return get_substituter()(value)
+
+
+def to_repr(ids: str) -> str:
+    # same as `repr(IDS.from_str(ids))`, including "None" for an empty string, but cached per string
+    return canonical_str(ids) if ids else "None"
 
 
 def parse_line(line: str, num: int) -> list[str]:
@@ -50,55 +60,142 @@ def parse_line(line: str, num: int) -> list[str]:
     return parts[:num]
 
 
+class ReplacementCycleError(ValueError):
+    def __init__(self, chain: tuple[str, ...]):
+        self.chain = chain
+        super().__init__(f"Replacement cycle: {' -> '.join(chain)}")
+
+
+class Replacements(dict):
+    # component repr -> IDS repr; every subtree is expanded once and memoized, whatever the order of the lookups
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._expanded: dict[int, int] = {}
+
+    # every write clears the memos; `dict` methods do not go through `__setitem__`/`__delitem__`, so each is wrapped
+    def _invalidate(self) -> None:
+        self._expanded.clear()
+
+    def __setitem__(self, key, value):
+        self._invalidate()
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._invalidate()
+        super().__delitem__(key)
+
+    def __ior__(self, other):
+        self._invalidate()
+        return super().__ior__(other)
+
+    def update(self, *args, **kwargs):
+        self._invalidate()
+        super().update(*args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self._invalidate()
+        return super().setdefault(key, default)
+
+    def pop(self, key, *default):
+        if key in self:
+            self._invalidate()
+        return super().pop(key, *default)
+
+    def popitem(self):
+        self._invalidate()
+        return super().popitem()
+
+    def clear(self):
+        self._invalidate()
+        super().clear()
+
+    def _expand(self, uid: int, chain: tuple[str, ...]) -> int:
+        result = self._expanded.get(uid)
+        if result is None:
+            node = SUBTREES.nodes[uid]
+            key = SUBTREES.repr(uid)
+            if len(node) > 1:
+                result = SUBTREES.intern((node[0], *(self._expand(child, chain) for child in node[1:])))
+            elif key not in self or self[key] == key:
+                result = uid
+            elif key in chain:
+                raise ReplacementCycleError(chain[chain.index(key) :] + (key,))
+            else:
+                result = self._expand(SUBTREES.intern_str(self[key]), chain + (key,))
+            self._expanded[uid] = result
+        return result
+
+    def expand(self, ids_repr: str) -> str:
+        if ids_repr == "None":
+            return ""
+        return SUBTREES.repr(self._expand(SUBTREES.intern_str(ids_repr), ()))
+
+    def expand_all(self) -> dict[str, str]:
+        return {key: self.expand(key) for key in self}
+
+
 def decompose_ids(REPLACEMENTS: dict, ids_repr: str) -> str:
-    if ids_repr == "None":
-        return ""
-    while True:
-        new_repr = ids_repr
-        for comp in re.findall(r"\[.*?\]", ids_repr):
-            if comp in REPLACEMENTS:
-                new_repr = re.sub(re.escape(comp), REPLACEMENTS[comp], new_repr)
-        if new_repr == ids_repr:
-            break
-        assert len(new_repr) < 100, f"New representation too long: {new_repr}"
-        ids_repr = new_repr
-    return ids_repr
+    if not isinstance(REPLACEMENTS, Replacements):
+        REPLACEMENTS = Replacements(REPLACEMENTS)
+    return REPLACEMENTS.expand(ids_repr)
 
 
-def parse_txt():
-    result: list[dict] = []
+def read_txt() -> Iterator[str]:
     for file_name in FILE_NAMES:
         file_path = TXT_DIR / f"abstract_{file_name}.txt"
         with file_path.open("r", encoding="utf-8") as f:
-            for line in f:
-                char, src_one, src_two, comment = parse_line(line, 4)
-                src_one = src_one if not src_one.startswith("*") else char + "(" + src_one.removeprefix("*") + ")"
-                comment = replaced(comment)
-                result.append({"char": char, "src_one": src_one, "src_two": src_two, "comment": comment.strip()})
-    return result
+            yield from f
+
+
+def parse_txt_line(line: str) -> dict:
+    char, src_one, src_two, comment = parse_line(line, 4)
+    src_one = src_one if not src_one.startswith("*") else char + "(" + src_one.removeprefix("*") + ")"
+    comment = replaced(comment)
+    return {"char": char, "src_one": src_one, "src_two": src_two, "comment": comment.strip()}
+
+
+def parse_txt():
+    return [parse_txt_line(line) for line in read_txt()]
+
+
+def parse_entry(entry: dict) -> dict:
+    entry_dict = {"char": entry["char"]}
+
+    if entry["src_one"] == "X":
+        entry_dict["x"] = True
+    elif not entry["src_one"].startswith("="):
+        entry_dict["ids"] = to_repr(entry["src_one"])
+    else:
+        entry_dict["is"] = entry["src_one"].removeprefix("=")
+
+    if entry["src_two"] and not entry["src_two"].startswith("*"):  # assert `src_two` is raw IDS
+        entry_dict["refer"] = to_repr(entry["src_two"])
+    elif entry["src_two"].startswith("*"):
+        entry_dict["to"] = entry["src_two"].removeprefix("*")
+
+    if entry["comment"]:
+        entry_dict["note"] = entry["comment"]
+    return entry_dict
 
 
 def parse_dict(ENTRIES: list[dict]) -> list[dict]:
-    result: list[dict] = []
-    for entry in ENTRIES:
-        entry_dict = {"char": entry["char"]}
+    return [parse_entry(entry) for entry in ENTRIES]
 
-        if entry["src_one"] == "X":
-            entry_dict["x"] = True
-        elif not entry["src_one"].startswith("="):
-            entry_dict["ids"] = repr(IDS.from_str(entry["src_one"]))
-        else:
-            entry_dict["is"] = entry["src_one"].removeprefix("=")
 
-        if entry["src_two"] and not entry["src_two"].startswith("*"):  # assert `src_two` is raw IDS
-            entry_dict["refer"] = repr(IDS.from_str(entry["src_two"]))
-        elif entry["src_two"].startswith("*"):
-            entry_dict["to"] = entry["src_two"].removeprefix("*")
+def _parse_chunk(lines: list[str]) -> list[dict]:
+    return [parse_entry(parse_txt_line(line)) for line in lines]
 
-        if entry["comment"]:
-            entry_dict["note"] = entry["comment"]
-        result.append(entry_dict)
-    return result
+
+def parse_lines(lines: list[str], jobs: int = 1) -> list[dict]:
+    # `parse_dict(parse_txt())` for the given lines; with several jobs the lines are cut into chunks that are
+    # parsed by a process pool and put back together in order
+    if jobs <= 1 or len(lines) < 2 * PARSE_CHUNK:
+        return _parse_chunk(lines)
+    chunk = max(PARSE_CHUNK, -(-len(lines) // (jobs * 4)))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        chunks = executor.map(_parse_chunk, (lines[i : i + chunk] for i in range(0, len(lines), chunk)))
+        return [entry for entries in chunks for entry in entries]
 
 
 def get_is_graph(ENTRIES: list[dict]) -> dict[str, set[str]]:
@@ -110,87 +207,186 @@ def get_is_graph(ENTRIES: list[dict]) -> dict[str, set[str]]:
     return graph
 
 
-def find_nodes_reachable_to(graph: dict[str, set[str]], target: str) -> set[str]:
-    if target not in graph:
-        return set()
+def strongly_connected(graph: dict[str, set[str]]) -> list[list[str]]:
+    # Tarjan's algorithm without recursion; components come out in reverse topological order (successors first)
+    index: dict[str, int] = {}
+    low: dict[str, int] = {}
+    stack: list[str] = []
+    on_stack: set[str] = set()
+    result: list[list[str]] = []
 
-    visited = set()
-    queue = deque()
+    for root in graph:
+        if root in index:
+            continue
+        work = [(root, iter(sorted(graph.get(root, ()))))]
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = low[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(sorted(graph.get(successor, ())))))
+                    break
+                if successor in on_stack:
+                    low[node] = min(low[node], index[successor])
+            else:
+                work.pop()
+                if work:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    result.append(component)
+    return result
 
-    if target in graph:
-        queue.extend(graph[target])
 
-    while queue:
-        current = queue.popleft()
-        if current not in visited:
-            visited.add(current)
-            if current in graph:
-                for neighbor in graph[current]:
-                    if neighbor not in visited:
-                        queue.append(neighbor)
-    return visited
+def find_cycle(graph: dict[str, set[str]], members: set[str]) -> list[str]:
+    # a shortest cycle through the first member, staying inside its component
+    start = min(members)
+    parents: dict[str, str] = {}
+    queue = [start]
+    for node in queue:
+        for successor in sorted(graph.get(node, ())):
+            if successor == start:
+                cycle = [start, node]
+                while cycle[-1] != start:
+                    cycle.append(parents[cycle[-1]])
+                return cycle[:0:-1] + [start]
+            if successor in members and successor not in parents:
+                parents[successor] = node
+                queue.append(successor)
+    return []
+
+
+def get_is_closure(graph: dict[str, set[str]]) -> tuple[dict[str, str], list[list[str]]]:
+    # for every key of `graph`, the characters reachable from it in one or more steps (itself included only on a
+    # cycle), as a sorted string, by one search per key; the keys that reach themselves are the ones on a cycle, and
+    # only their subgraph goes through `strongly_connected` to report one cycle per component
+    result = {}
+    on_cycle: set[str] = set()
+    for key in graph:
+        reached: set[str] = set()
+        queue = [key]
+        for node in queue:
+            for successor in graph.get(node, ()):
+                if successor not in reached:
+                    reached.add(successor)
+                    queue.append(successor)
+        if key in reached:
+            on_cycle.add(key)
+        result[key] = "".join(sorted(reached))
+
+    subgraph = {node: graph[node] & on_cycle for node in graph if node in on_cycle}
+    return result, [find_cycle(graph, set(component)) for component in strongly_connected(subgraph)]
+
+
+def group_by_char(ENTRIES: list[dict]) -> dict[str, list[dict]]:
+    groups: dict[str, list[dict]] = {}
+    for entry in ENTRIES:
+        if entry.get("char"):
+            groups.setdefault(entry["char"], []).append(entry)
+    return groups
 
 
-def get_replacements(ENTRIES: list[dict], only_is: bool) -> dict:
-    result = {}
+def get_replacements(ENTRIES: list[dict], only_is: bool, GROUPS: Optional[dict[str, list[dict]]] = None) -> Replacements:
+    # `GROUPS` (see `group_by_char`) may be shared between calls: entries are only read here, so changes made to
+    # them in between are seen
+    GROUPS = GROUPS if GROUPS is not None else group_by_char(ENTRIES)
+    result = Replacements()
+    targets: dict[str, str] = {}
 
     for entry in ENTRIES:
         if not entry.get("char"):
             continue
 
-        char_repr = repr(IDS.from_str(entry["char"]))
+        char_repr = to_repr(entry["char"])
         if entry.get("x") is True:
             result[char_repr] = "[X]"
             continue
 
-        is_entry = [e for e in ENTRIES if e.get("is") and e.get("char") == entry["char"]]
-        ids_entry = [e for e in ENTRIES if e.get("ids") and e.get("char") == entry["char"]]
+        if entry["char"] not in targets:
+            is_entry = [e for e in GROUPS[entry["char"]] if e.get("is")]
+            ids_entry = [e for e in GROUPS[entry["char"]] if e.get("ids")]
 
-        if len(is_entry) == 1 and len(ids_entry) == 0:
-            is_repr = repr(IDS.from_str(is_entry[0]["is"]))
-            result[char_repr] = is_repr
-            continue
-        if not only_is:
-            if len(ids_entry) == 1:
-                ids_repr = ids_entry[0]["ids"]
-                result[char_repr] = ids_repr
-                continue
+            targets[entry["char"]] = ""
+            if len(is_entry) == 1 and len(ids_entry) == 0:
+                targets[entry["char"]] = to_repr(is_entry[0]["is"])
+            elif not only_is and len(ids_entry) == 1:
+                targets[entry["char"]] = ids_entry[0]["ids"]
+        if targets[entry["char"]]:
+            result[char_repr] = targets[entry["char"]]
 
     return result
 
 
-def get_variants(ENTRIES: list[dict], IS_RELATION: dict, REPLACEMENTS: dict) -> dict:
-    result = {}
+class BuildWarning(NamedTuple):
+    kind: str  # "no_characters", "multiple_characters", "is_cycle" or "component"
+    subject: str
+    detail: str
+
+    def __str__(self) -> str:
+        if self.kind == "no_characters":
+            return f"No characters for {self.subject}: {self.detail}"
+        if self.kind == "multiple_characters":
+            return f"Multiple characters for {self.subject}: {self.detail}"
+        if self.kind == "is_cycle":
+            return f'Cycle in "is" relations: {self.subject}'
+        return f"Referenced IDS {self.subject} found in all IDSs" + (f" ({self.detail})" if self.detail else "")
+
+    def to_dict(self) -> dict[str, str]:
+        return {"kind": self.kind, "subject": self.subject, "detail": self.detail}
+
+
+def get_variants(ENTRIES: list[dict], IS_RELATION: dict, REPLACEMENTS: dict, canonical: bool = False) -> dict:
+    # shape -> (characters, variants), both insertion-ordered sets (dicts with `None` values); with `canonical`,
+    # shapes with the same normal form (see `ids.SubtreeTable.normalize`) share one group, keyed by the first of them
+    result: dict[str, tuple[dict[str, None], dict[str, None]]] = {}
+    first_reprs: dict = {}
     for entry in ENTRIES:
         if "ids" in entry:
             ids_repr = entry["ids"]
             ids_repr = decompose_ids(REPLACEMENTS, ids_repr)
+            if canonical:
+                ids_repr = first_reprs.setdefault(canonical_key(ids_repr), ids_repr)
 
-            chars_str = result.setdefault(ids_repr, ["", ""])
-            if entry["char"] not in chars_str[0]:
-                chars_str[0] += entry["char"]
-            if entry["char"] in IS_RELATION:
-                for c in IS_RELATION[entry["char"]]:
-                    if c not in chars_str[1]:
-                        chars_str[1] += c
+            chars, variants = result.setdefault(ids_repr, ({}, {}))
+            chars[entry["char"]] = None
+            variants.update(dict.fromkeys(IS_RELATION.get(entry["char"], "")))
     return result
 
 
-def get_new_variants(VARIANTS: dict) -> dict:
+def get_new_variants(VARIANTS: dict, warnings: Optional[list[BuildWarning]] = None) -> dict:
+    # shape -> "chars@variants", by sorted shape; when several characters share a shape, those that do not occur in
+    # it are moved to the variants; odd groups are appended to `warnings`, or printed without it
     result = {}
-    ids_repr_sorted = sorted(VARIANTS.keys())
-    for ids_repr in ids_repr_sorted:
-        if len(VARIANTS[ids_repr][0]) > 1:
-            for variant in VARIANTS[ids_repr][0]:
-                if variant not in ids_repr:
-                    VARIANTS[ids_repr][0] = "".join(v for v in VARIANTS[ids_repr][0] if v != variant)
-                    if variant not in VARIANTS[ids_repr][1]:
-                        VARIANTS[ids_repr][1] += variant
-        result[ids_repr] = VARIANTS[ids_repr][0] + "@" + "".join(sorted(VARIANTS[ids_repr][1]))
-        if len(VARIANTS[ids_repr][0]) < 1:
-            print(f"Warning: No characters for {ids_repr}: {''.join(sorted(VARIANTS[ids_repr][1]))}")
-        if len(VARIANTS[ids_repr][0]) > 1:
-            print(f"Warning: Multiple characters for {ids_repr}: {VARIANTS[ids_repr][0]}")
+    found: list[BuildWarning] = []
+    for ids_repr in sorted(VARIANTS.keys()):
+        chars, variants = VARIANTS[ids_repr]
+        if len(chars) > 1:
+            in_shape = set(ids_repr)
+            moved = [char for char in chars if char not in in_shape]
+            chars = {char: None for char in chars if char in in_shape}
+            variants = {**variants, **dict.fromkeys(moved)}
+        result[ids_repr] = "".join(chars) + "@" + "".join(sorted(variants))
+        if len(chars) < 1:
+            found.append(BuildWarning("no_characters", ids_repr, "".join(sorted(variants))))
+        if len(chars) > 1:
+            found.append(BuildWarning("multiple_characters", ids_repr, "".join(chars)))
+
+    if warnings is None:
+        for warning in found:
+            print(f"Warning: {warning}")
+    else:
+        warnings.extend(found)
     return result
 
 
@@ -203,12 +399,25 @@ def decompose(ENTRIES: list[dict], REPLACEMENTS: dict):
                 entry["new_ids"] = new_ids_repr
 
 
-def assert_refer(ENTRIES, REPLACEMENTS, ALL):
+def component_set(reprs: Iterable[str]) -> set[str]:
+    # every component (`A` or `A(B)`) of the given IDS reprs, for exact membership tests
+    return {comp for ids_repr in reprs for comp in COMPONENT.findall(ids_repr)}
+
+
+def check_components(ids_repr: str, ALL_IDS: set[str], violations: Optional[list[BuildWarning]], where: str = "") -> None:
+    # components of `ids_repr` found in `ALL_IDS` are appended to `violations`, or fail at once without it
+    for comp in COMPONENT.findall(ids_repr):
+        if comp in ALL_IDS:
+            violation = BuildWarning("component", f"[{comp}]", where)
+            assert violations is not None, str(violation)
+            violations.append(violation)
+
+
+def assert_refer(ENTRIES, REPLACEMENTS, ALL: set[str], violations: Optional[list[BuildWarning]] = None):
     for entry in ENTRIES:
         if "refer" in entry:
             decomposed_ids = decompose_ids(REPLACEMENTS, entry["refer"])
-            for ids in re.findall(r"\[.*?\]", decomposed_ids):
-                assert ids[1:-1] not in ALL, f"Referenced IDS {ids} found in all IDSs"
+            check_components(decomposed_ids, ALL, violations, f"refer of {entry.get('char', decomposed_ids)}")
 
 
 def get_geta() -> dict[str, str]:
@@ -227,7 +436,7 @@ def get_geta() -> dict[str, str]:
     return result
 
 
-def get_extra(REPLACEMENTS: dict[str, str], ALL_IDS: str) -> list[dict[str, str]]:
+def get_extra(REPLACEMENTS: dict[str, str], ALL_IDS: set[str], violations: Optional[list[BuildWarning]] = None) -> list[dict[str, str]]:
     extra_path = TXT_DIR / "extra.txt"
     if not extra_path.exists():
         return []
@@ -239,15 +448,13 @@ def get_extra(REPLACEMENTS: dict[str, str], ALL_IDS: str) -> list[dict[str, str]
         shape, refer, note = line.split("\t")
         line_dict = {}
 
-        shape = repr(IDS.from_str(shape.strip()))
+        shape = to_repr(shape.strip())
         shape = decompose_ids(REPLACEMENTS, shape.strip())
-        for ids in re.findall(r"\[.*?\]", shape):
-            assert ids[1:-1] not in ALL_IDS, f"Referenced IDS {ids} found in all IDSs"
-        refer = repr(IDS.from_str(refer.strip()))
+        check_components(shape, ALL_IDS, violations, f"extra {shape}")
+        refer = to_repr(refer.strip())
         refer = decompose_ids(REPLACEMENTS, refer.strip())
         if refer:
-            for ids in re.findall(r"\[.*?\]", refer):
-                assert ids[1:-1] not in ALL_IDS, f"Referenced IDS {ids} found in all IDSs"
+            check_components(refer, ALL_IDS, violations, f"extra {shape}")
         note = replaced(note)
 
         if shape:
@@ -263,149 +470,267 @@ def get_extra(REPLACEMENTS: dict[str, str], ALL_IDS: str) -> list[dict[str, str]
     return result
 
 
-def get_ob(REPLACEMENTS: dict[str, str], ALL_IDS: str) -> dict[str, str]:
-    ob_path = TXT_DIR / "ob.txt"
-    if not ob_path.exists():
-        return {}
-    with ob_path.open("r", encoding="utf-8") as f:
-        lines = f.readlines()
-
-    line_dicts = []
-    for line in lines:
-        code, char, con, recon, comm = parse_line(line.strip(), 5)
-        line_dict = {"code": code, "ob": char}
-        if con:
-            con = repr(IDS.from_str(con.strip()))
-            con = decompose_ids(REPLACEMENTS, con.strip())
-            # for ids in re.findall(r"\[.*?\]", con):
-            #     assert ids[1:-1] not in ALL_IDS, f"Referenced IDS {ids} found in all IDSs"
-            line_dict["ids"] = con
-        if recon:
-            recon = repr(IDS.from_str(recon.strip()))
-            recon = decompose_ids(REPLACEMENTS, recon.strip())
-            # for ids in re.findall(r"\[.*?\]", recon):
-            #     assert ids[1:-1] not in ALL_IDS, f"Referenced IDS {ids} found in all IDSs"
-            line_dict["refer"] = recon
-        if comm:
-            line_dict["note"] = comm.strip()
-        if line_dict:
-            line_dicts.append(line_dict)
-
-    ids_list = []
+def parse_ob_line(REPLACEMENTS: dict[str, str], line: str) -> dict[str, str]:
+    code, char, con, recon, comm = parse_line(line.strip(), 5)
+    line_dict = {"code": code, "ob": char}
+    if con:
+        con = to_repr(con.strip())
+        con = decompose_ids(REPLACEMENTS, con.strip())
+        line_dict["ids"] = con
+    if recon:
+        recon = to_repr(recon.strip())
+        recon = decompose_ids(REPLACEMENTS, recon.strip())
+        line_dict["refer"] = recon
+    if comm:
+        line_dict["note"] = comm.strip()
+    return line_dict
+
+
+def group_ob(line_dicts: Iterable[dict[str, str]]) -> dict[str, str]:
+    # IDS in order of first appearance, each with its glyphs as `first@rest`; lines without IDS are skipped
+    groups: dict[str, list[str]] = {}
     for item in line_dicts:
         if "ids" in item:
-            if item["ids"] not in ids_list:
-                ids_list.append(item["ids"])
+            groups.setdefault(item["ids"], []).append(item["ob"] + item["code"])
 
     result = {}
-    for ids in ids_list:
-        chars = [item["ob"] + item["code"] for item in line_dicts if item["ids"] == ids]
+    for ids, chars in groups.items():
         result[ids] = chars[0] + "@" + "".join(chars[1:])
         assert chars[0]
     return result
 
 
-def custom_dump(obj, indent=2):
-    compact_json = json.dumps(obj, separators=(",", ":"), indent=indent, ensure_ascii=False)
-    parsed = json.loads(compact_json)
-
-    def encode_with_condition(o):
+def get_ob(
+    REPLACEMENTS: dict[str, str],
+    ALL_IDS: set[str],
+    lines: Optional[Iterable[str]] = None,
+    violations: Optional[list[BuildWarning]] = None,
+) -> dict[str, str]:
+    # `lines` defaults to `ob.txt`, read as a stream; with `violations`, the components of every line are checked
+    # against `ALL_IDS`
+    if lines is None:
+        ob_path = TXT_DIR / "ob.txt"
+        if not ob_path.exists():
+            return {}
+        with ob_path.open("r", encoding="utf-8") as f:
+            return get_ob(REPLACEMENTS, ALL_IDS, f, violations)
+
+    def checked(line_dict: dict[str, str]) -> dict[str, str]:
+        for key in ("ids", "refer"):
+            if key in line_dict:
+                check_components(line_dict[key], ALL_IDS, violations, f"ob {line_dict['ob']}{line_dict['code']}")
+        return line_dict
+
+    line_dicts = (parse_ob_line(REPLACEMENTS, line) for line in lines)
+    return group_ob(map(checked, line_dicts) if violations is not None else line_dicts)
+
+
+def _json_key(key) -> str:
+    # the key a dict key becomes once dumped and loaded back by `json`
+    if isinstance(key, str):
+        return key
+    if key is True:
+        return "true"
+    if key is False:
+        return "false"
+    if key is None:
+        return "null"
+    if isinstance(key, (int, float)):
+        return json.dumps(key)
+    raise TypeError(f"keys must be str, int, float, bool or None, not {key.__class__.__name__}")
+
+
+def custom_dump_to(f, obj, indent=2) -> None:
+    # writes `custom_dump(obj, indent)` to `f` piece by piece: dicts and lists of 10 items or more one item per
+    # line, the others inline
+    write = f.write
+    pad = " " * indent
+
+    def encode(o):
         if isinstance(o, dict):
-            if len(o) >= 10:
-                items = []
-                for k, v in o.items():
-                    k_str = json.dumps(k, ensure_ascii=False)
-                    v_str = encode_with_condition(v)
-                    items.append(f"{' ' * indent}{k_str}: {v_str}")
-                return "{\n" + ",\n".join(items) + "\n}"
-            else:
-                items = []
-                for k, v in o.items():
-                    k_str = json.dumps(k, ensure_ascii=False)
-                    v_str = encode_with_condition(v)
-                    items.append(f"{k_str}: {v_str}")
-                return "{" + ", ".join(items) + "}"
-        elif isinstance(o, list):
-            if len(o) >= 10:
-                items = []
-                for item in o:
-                    items.append(" " * indent + encode_with_condition(item))
-                return "[\n" + ",\n".join(items) + "\n]"
-            else:
-                items = []
-                for item in o:
-                    items.append(encode_with_condition(item))
-                return "[" + ", ".join(items) + "]"
+            if not all(isinstance(k, str) for k in o):
+                o = {_json_key(k): v for k, v in o.items()}
+            multiline = len(o) >= 10
+            write("{\n" if multiline else "{")
+            for i, (k, v) in enumerate(o.items()):
+                if i:
+                    write(",\n" if multiline else ", ")
+                write(f"{pad}{json.dumps(k, ensure_ascii=False)}: " if multiline else f"{json.dumps(k, ensure_ascii=False)}: ")
+                encode(v)
+            write("\n}" if multiline else "}")
+        elif isinstance(o, (list, tuple)):
+            multiline = len(o) >= 10
+            write("[\n" if multiline else "[")
+            for i, item in enumerate(o):
+                if i:
+                    write(",\n" if multiline else ", ")
+                if multiline:
+                    write(pad)
+                encode(item)
+            write("\n]" if multiline else "]")
         else:
-            return json.dumps(o, ensure_ascii=False)
-
-    return encode_with_condition(parsed)
+            write(json.dumps(o, ensure_ascii=False))
 
+    encode(obj)
 
-def txt_to_json() -> None:
-    # first parsing
-    ONE_ENTRIES = parse_txt()
 
-    # second parsing
-    TWO_ENTRIES = parse_dict(ONE_ENTRIES)
-
-    is_replacements = get_replacements(TWO_ENTRIES, only_is=True)
-    for entry in TWO_ENTRIES:
-        if "ids" in entry:
-            entry["ids"] = decompose_ids(is_replacements, entry["ids"])
+def custom_dump(obj, indent=2):
+    f = io.StringIO()
+    custom_dump_to(f, obj, indent)
+    return f.getvalue()
+
+
+def txt_to_json(
+    profiler: Optional[Profiler] = None,
+    profile_statistics: bool = False,
+    jobs: int = 1,
+    shards: bool = False,
+    validate: bool = True,
+    compress: bool = False,
+) -> None:
+    # with `profiler`, every stage is measured, and with `profile_statistics` its key numbers follow the shape count
+    # in `STAT_FILE`; with `jobs`, lines are parsed by a process pool; with `shards`, the document is also written
+    # to `SHARD_DIR` as per-block files and a manifest; unless `validate` is off, the components of extra shapes,
+    # refers and OB lines are checked; every warning is printed and written to `WARNINGS_FILE`; with `compress`,
+    # gzip/brotli variants of the written JSON files are kept next to them, with a manifest of their hashes
+    profiler = profiler or Profiler(enabled=False)
+
+    # first and second parsing
+    if jobs > 1:
+        with profiler.stage("parse_parallel") as stage:
+            TWO_ENTRIES = parse_lines(list(read_txt()), jobs)
+            stage.count = len(TWO_ENTRIES)
+    else:
+        with profiler.stage("parse_txt") as stage:
+            ONE_ENTRIES = parse_txt()
+            stage.count = len(ONE_ENTRIES)
+        with profiler.stage("parse_dict") as stage:
+            TWO_ENTRIES = parse_dict(ONE_ENTRIES)
+            stage.count = len(TWO_ENTRIES)
+
+    with profiler.stage("is_replacements") as stage:
+        GROUPS = group_by_char(TWO_ENTRIES)
+        is_replacements = get_replacements(TWO_ENTRIES, only_is=True, GROUPS=GROUPS)
+        for entry in TWO_ENTRIES:
+            if "ids" in entry:
+                entry["ids"] = decompose_ids(is_replacements, entry["ids"])
+        stage.count = len(is_replacements)
 
     # third parsing
-    is_graph = get_is_graph(TWO_ENTRIES)
-
-    is_relation = {b: "".join(find_nodes_reachable_to(is_graph, b)) for b in is_graph}
-    THREE_ALL = "".join(a for as_ in is_graph.values() for a in as_)
-
-    FOUR_REPLACE = get_replacements(TWO_ENTRIES, only_is=False)
-    FIVE_VARIANTS = get_variants(TWO_ENTRIES, is_relation, FOUR_REPLACE)
-    SIX_VARIANTS = get_new_variants(FIVE_VARIANTS)
-
-    decompose(TWO_ENTRIES, FOUR_REPLACE)
-
-    GETA = get_geta()
-    EXTRA = get_extra(FOUR_REPLACE, THREE_ALL)
-    TWO_ENTRIES.extend(EXTRA)
-
-    SIX_ALL = "".join(entry.get("new_ids", "") or entry.get("ids", "") for entry in TWO_ENTRIES)
-    # assert_refer(TWO_ENTRIES, FOUR_REPLACE, SIX_ALL)
-    OB = get_ob(FOUR_REPLACE, SIX_ALL)
+    with profiler.stage("is_relation") as stage:
+        is_graph = get_is_graph(TWO_ENTRIES)
+
+        is_relation, is_cycles = get_is_closure(is_graph)
+        warnings = [BuildWarning("is_cycle", " = ".join(cycle), "") for cycle in is_cycles]
+        THREE_ALL = {a for as_ in is_graph.values() for a in as_} if validate else set()
+        stage.count = len(is_relation)
+
+    with profiler.stage("replacements") as stage:
+        FOUR_REPLACE = get_replacements(TWO_ENTRIES, only_is=False, GROUPS=GROUPS)
+        stage.count = len(FOUR_REPLACE)
+    with profiler.stage("get_variants") as stage:
+        FIVE_VARIANTS = get_variants(TWO_ENTRIES, is_relation, FOUR_REPLACE)
+        stage.count = len(FIVE_VARIANTS)
+    with profiler.stage("get_new_variants") as stage:
+        SIX_VARIANTS = get_new_variants(FIVE_VARIANTS, warnings)
+        stage.count = len(SIX_VARIANTS)
+
+    with profiler.stage("decompose") as stage:
+        decompose(TWO_ENTRIES, FOUR_REPLACE)
+        stage.count = sum(1 for entry in TWO_ENTRIES if "new_ids" in entry)
+
+    violations: Optional[list[BuildWarning]] = [] if validate else None
+    with profiler.stage("extra") as stage:
+        GETA = get_geta()
+        EXTRA = get_extra(FOUR_REPLACE, THREE_ALL, violations)
+        TWO_ENTRIES.extend(EXTRA)
+        stage.count = len(EXTRA)
+    extra_violations = len(violations or [])
+
+    SIX_ALL: set[str] = set()
+    if validate:
+        with profiler.stage("validate") as stage:
+            SIX_ALL = component_set(entry.get("new_ids", "") or entry.get("ids", "") for entry in TWO_ENTRIES)
+            assert_refer(TWO_ENTRIES, FOUR_REPLACE, SIX_ALL, violations)
+            stage.count = len(SIX_ALL)
+
+    with profiler.stage("ob") as stage:
+        OB = get_ob(FOUR_REPLACE, SIX_ALL, violations=violations)
+        stage.count = len(OB)
+
+    warnings.extend(violations or [])
+    for warning in warnings:
+        print(f"Warning: {warning}")
+    WARNINGS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with WARNINGS_FILE.open("w", encoding="utf-8") as f:
+        json.dump([warning.to_dict() for warning in warnings], f, ensure_ascii=False, indent=2)
+    assert not extra_violations, f"{extra_violations} extra shape(s) reference IDS found in all IDSs"
 
     # write to json
-    JSON_DIR.parent.mkdir(parents=True, exist_ok=True)
-    with JSON_DIR.open("w", encoding="utf-8") as f:
-        f.write(custom_dump({"entries": TWO_ENTRIES, "shapes": SIX_VARIANTS, "shape_count": len(SIX_VARIANTS), "geta": GETA, "ob": OB}))
+    document = {"entries": TWO_ENTRIES, "shapes": SIX_VARIANTS, "shape_count": len(SIX_VARIANTS), "geta": GETA, "ob": OB}
+    with profiler.stage("dump") as stage:
+        JSON_DIR.parent.mkdir(parents=True, exist_ok=True)
+        with JSON_DIR.open("w", encoding="utf-8") as f:
+            custom_dump_to(f, document)
+        stage.count = len(TWO_ENTRIES)
+    if shards:
+        with profiler.stage("shards") as stage:
+            stage.count = len(write_shards(SHARD_DIR, document, custom_dump_to)["shards"])
+    if compress:
+        with profiler.stage("compress") as stage:
+            paths = [JSON_DIR] + (sorted(SHARD_DIR.glob("*.json")) if shards else [])
+            stage.count = len(compress_artifacts(paths, JSON_DIR.parent / COMPRESSED_MANIFEST))
 
     # write to statistics
+    columns = [str(len(SIX_VARIANTS))] + (profiler.columns() if profile_statistics else [])
     STAT_FILE.parent.mkdir(parents=True, exist_ok=True)
     today = datetime.now().strftime("%Y-%m-%d")
-    shape_count = len(SIX_VARIANTS)
     lines = []
     if STAT_FILE.exists():
         with STAT_FILE.open("r", encoding="utf-8") as f:
             lines = [line.strip() for line in f.readlines() if line.strip()]
     if lines and lines[-1].startswith(today):
-        lines[-1] = f"{today}\t{shape_count}"
+        lines[-1] = "\t".join([today, *columns])
     else:
-        lines.append(f"{today}\t{shape_count}")
+        lines.append("\t".join([today, *columns]))
     with STAT_FILE.open("w", encoding="utf-8") as f:
         f.write("\n".join(lines))
 
 
-def main():
-    txt_to_json()
+def main(
+    profiler: Optional[Profiler] = None,
+    profile_statistics: bool = False,
+    jobs: int = 1,
+    shards: bool = False,
+    validate: bool = True,
+    compress: bool = False,
+):
+    txt_to_json(profiler, profile_statistics, jobs, shards, validate, compress)
 
 
 if __name__ == "__main__":
+    import argparse
     from datetime import datetime
 
     from build_txt import main as build_txt_main
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", nargs="?", const=PROFILE_FILE, type=Path, help="write a per-stage timing report (JSON)")
+    parser.add_argument("--profile-statistics", action="store_true", help="with --profile, also add the total time and peak memory to statistics.tsv")
+    parser.add_argument("--jobs", type=int, default=1, help="parse the input with this many processes")
+    parser.add_argument("--shards", action="store_true", help="also write per-block shards and a manifest next to abstract.json")
+    parser.add_argument("--no-validate", dest="validate", action="store_false", help="skip the component checks of refers, extra and OB")
+    parser.add_argument("--compress", action="store_true", help="also write gzip/brotli variants and a hash manifest")
+    args = parser.parse_args()
+
+    profiler = Profiler(enabled=args.profile is not None)
     begin = datetime.now()
-    build_txt_main()
-    main()
+    with profiler.stage("build_txt"):
+        build_txt_main()
+    main(profiler, args.profile_statistics and profiler.enabled, args.jobs, args.shards, args.validate, args.compress)
     end = datetime.now()
     print(f"Time cost: {end - begin}")
+    if profiler.enabled:
+        profiler.stop()
+        profiler.print()
+        profiler.write(args.profile)
@@ -0,0 +1,141 @@
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Union
+
+# Layout of a .corpus file, all integers native unsigned 32-bit:
+#   header   magic, byte-order mark, number of characters
+#   table    sorted codepoints of the characters
+#   offsets  count + 1 offsets into the heap
+#   heap     UTF-8 records: for every character, the tab-separated fields of each of its lines, lines joined by "\n"
+MAGIC = b"ASCORP01"
+BOM = 0x01020304
+HEADER = struct.Struct("=8sII")
+SUFFIX = ".corpus"
+
+
+def read_lines(txt_path: Union[str, Path]) -> dict[int, list[str]]:
+    records: dict[int, list[str]] = {}
+    with open(txt_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if "\t" not in line:
+                continue
+            char, fields = line.split("\t", 1)
+            if len(char) != 1:
+                raise ValueError(f"{txt_path}: key {char!r} is not a single character")
+            records.setdefault(ord(char), []).append(fields)
+    return records
+
+
+def convert(txt_path: Union[str, Path], corpus_path: Union[str, Path, None] = None) -> Path:
+    txt_path = Path(txt_path)
+    corpus_path = Path(corpus_path) if corpus_path else txt_path.with_suffix(SUFFIX)
+    records = read_lines(txt_path)
+    codepoints = array("I", sorted(records))
+    offsets = array("I", [0])
+    heap = bytearray()
+    for codepoint in codepoints:
+        heap += "\n".join(records[codepoint]).encode("utf-8")
+        offsets.append(len(heap))
+
+    temp_path = corpus_path.with_suffix(SUFFIX + ".tmp")
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, BOM, len(codepoints)))
+        f.write(codepoints.tobytes())
+        f.write(offsets.tobytes())
+        f.write(heap)
+    os.replace(temp_path, corpus_path)
+    return corpus_path
+
+
+class Corpus(Mapping):
+    # Read-only mapping char -> lines -> fields over a memory-mapped .corpus file. Lookups binary-search the
+    # mapped codepoint table and slice the mapped heap, so opening costs the same whatever the corpus size.
+    def __init__(self, corpus_path: Union[str, Path]):
+        self.path = Path(corpus_path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, bom, count = HEADER.unpack_from(view)
+        if magic != MAGIC or bom != BOM:
+            view.release()
+            self._mmap.close()
+            raise ValueError(f"{self.path} is not a corpus file for this platform")
+        table = HEADER.size
+        heap = table + 4 * (2 * count + 1)
+        self._codepoints = view[table : table + 4 * count].cast("I")
+        self._offsets = view[table + 4 * count : heap].cast("I")
+        self._heap = view[heap:]
+
+    @classmethod
+    def open(cls, txt_path: Union[str, Path]) -> "Corpus":
+        # converts the text file on first use, and again whenever it is newer than its .corpus file
+        txt_path = Path(txt_path)
+        corpus_path = txt_path.with_suffix(SUFFIX)
+        if not corpus_path.exists() or corpus_path.stat().st_mtime < txt_path.stat().st_mtime:
+            convert(txt_path, corpus_path)
+        try:
+            return cls(corpus_path)
+        except ValueError:
+            return cls(convert(txt_path, corpus_path))
+
+    def _find(self, char: str) -> int:
+        if not isinstance(char, str) or len(char) != 1:
+            return -1
+        codepoint = ord(char)
+        index = bisect_left(self._codepoints, codepoint)
+        return index if index < len(self._codepoints) and self._codepoints[index] == codepoint else -1
+
+    def raw(self, char: str) -> memoryview:
+        index = self._find(char)
+        if index < 0:
+            raise KeyError(char)
+        return self._heap[self._offsets[index] : self._offsets[index + 1]]
+
+    def __getitem__(self, char: str) -> list[list[str]]:
+        return [line.split("\t") for line in str(self.raw(char), "utf-8").split("\n")]
+
+    def __contains__(self, char: object) -> bool:
+        return self._find(char) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        return map(chr, self._codepoints)
+
+    def __len__(self) -> int:
+        return len(self._codepoints)
+
+    def close(self) -> None:
+        for view in (self._codepoints, self._offsets, self._heap):
+            view.release()
+        self._mmap.close()
+
+
+class CorpusView(Mapping):
+    # Lazily parsed view of a corpus; characters for which `parse` returns nothing are treated as absent.
+    def __init__(self, corpus: Corpus, parse: Callable[[list[list[str]]], Optional[object]]):
+        self.corpus = corpus
+        self.parse = parse
+
+    def __getitem__(self, char: str):
+        value = self.parse(self.corpus[char])
+        if not value:
+            raise KeyError(char)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        return (char for char in self.corpus if self.parse(self.corpus[char]))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+if __name__ == "__main__":
+    import sys
+
+    for path in sys.argv[1:]:
+        print(convert(path))
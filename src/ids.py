@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import Optional
+from array import array
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional, Sequence, Union
 
 from anytree import NodeMixin
 
@@ -25,7 +27,8 @@ class IDC:
     MI = "⿾"
     RO = "⿿"
     VA = "〾"
-    ALL = {LR, LL, UD, UU, RD, RU, LD, LU, OD, OR, OU, OL, OC, XX, MI, RO, VA}
+    ORDER = (LR, LL, UD, UU, RD, RU, LD, LU, OD, OR, OU, OL, OC, XX, MI, RO, VA)
+    ALL = set(ORDER)
 
     @classmethod
     def arity(cls, idc: IDC_) -> int:
@@ -39,17 +42,166 @@ class IDC:
             raise ValueError(f"Unknown IDC: {idc}")
 
 
+class IDSSyntaxError(ValueError):
+    def __init__(self, message: str, text: str, pos: int, line: Optional[int] = None):
+        super().__init__(message)
+        self.message = message
+        self.text = text
+        self.pos = pos
+        self.line = line
+
+    def __str__(self) -> str:
+        if self.line is None:
+            return self.message
+        return f"line {self.line}, column {self.pos + 1}: {self.message}"
+
+
+# Table-driven tokenizer shared by every parser below. It accepts the raw form (`⿰亻可(口)`) as well as
+# the bracketed form produced by `repr` (`⿰ [亻] [可(口)]`), and yields operators and component shapes.
+
+_SPACE, _OP, _LPAREN, _RPAREN, _LBRACKET, _RBRACKET, _OTHER, _END = range(8)
+_TOKEN, _COMPONENT, _PAREN, _CLOSE, _BRACKET, _BRACKET_COMPONENT, _BRACKET_PAREN, _BRACKET_CLOSE, _BRACKET_END = range(9)
+_SKIP, _OPERATOR, _HOLD, _APPEND, _EMIT, _REEMIT, _APPEND_EMIT = range(7)
+
+_CHAR_CLASSES = {op: _OP for op in IDC.ORDER} | {"(": _LPAREN, ")": _RPAREN, "[": _LBRACKET, "]": _RBRACKET, "": _END}
+_ARITY_OF = {op: IDC.arity(op) for op in IDC.ORDER}
+
+_TRANSITIONS = {
+    (_TOKEN, _SPACE): (_SKIP, _TOKEN),
+    (_TOKEN, _OP): (_OPERATOR, _TOKEN),
+    (_TOKEN, _OTHER): (_HOLD, _COMPONENT),
+    (_TOKEN, _LBRACKET): (_SKIP, _BRACKET),
+    (_COMPONENT, _LPAREN): (_APPEND, _PAREN),
+    **{(_COMPONENT, cls): (_REEMIT, _TOKEN) for cls in (_SPACE, _OP, _RPAREN, _LBRACKET, _RBRACKET, _OTHER, _END)},
+    **{(_PAREN, cls): (_APPEND, _CLOSE) for cls in (_SPACE, _LBRACKET, _RBRACKET, _OTHER)},
+    (_CLOSE, _RPAREN): (_APPEND_EMIT, _TOKEN),
+    (_BRACKET, _OTHER): (_HOLD, _BRACKET_COMPONENT),
+    (_BRACKET_COMPONENT, _LPAREN): (_APPEND, _BRACKET_PAREN),
+    (_BRACKET_COMPONENT, _RBRACKET): (_EMIT, _TOKEN),
+    **{(_BRACKET_PAREN, cls): (_APPEND, _BRACKET_CLOSE) for cls in (_SPACE, _OTHER)},
+    (_BRACKET_CLOSE, _RPAREN): (_APPEND, _BRACKET_END),
+    (_BRACKET_END, _RBRACKET): (_EMIT, _TOKEN),
+}
+_ERRORS = {
+    _TOKEN: "Unexpected character: {c}",
+    _PAREN: "Unexpected character in parentheses: {c}",
+    _CLOSE: "Expected ')'",
+    _BRACKET: "Unexpected character in brackets: {c}",
+    _BRACKET_COMPONENT: "Expected ']'",
+    _BRACKET_PAREN: "Unexpected character in parentheses: {c}",
+    _BRACKET_CLOSE: "Expected ')'",
+    _BRACKET_END: "Expected ']'",
+}
+_END_ERRORS = {
+    _TOKEN: "Unexpected end of string: {ids}",
+    _PAREN: "Unexpected end of string after '('",
+    _BRACKET: "Unexpected end of string: {ids}",
+    _BRACKET_PAREN: "Unexpected end of string after '('",
+}
+
+
+def tokenize(ids: str, strict: bool = False) -> list[str]:
+    tokens: list[str] = []
+    if not ids:
+        return tokens
+    state, shape, pending, index, length = _TOKEN, "", 1, 0, len(ids)
+    while True:
+        c = ids[index] if index < length else ""
+        cls = _CHAR_CLASSES.get(c)
+        if cls is None:
+            cls = _SPACE if c.isspace() else _OTHER
+        step = _TRANSITIONS.get((state, cls))
+        if step is None:
+            message = _END_ERRORS.get(state, _ERRORS[state]) if cls == _END else _ERRORS[state]
+            raise IDSSyntaxError(message.format(c=c, ids=ids), ids, index)
+        action, state = step
+        if action == _HOLD:
+            shape = c
+        elif action == _APPEND:
+            shape += c
+        elif action == _OPERATOR:
+            tokens.append(c)
+            pending += _ARITY_OF[c] - 1
+        elif action != _SKIP:
+            if action == _APPEND_EMIT:
+                shape += c
+            tokens.append(shape)
+            pending -= 1
+            if action != _REEMIT:
+                index += 1
+            if pending == 0:
+                break
+            continue
+        index += 1
+
+    if strict:
+        for index in range(index, length):
+            if not ids[index].isspace():
+                raise IDSSyntaxError(f"Unexpected trailing character: {ids[index]}", ids, index)
+    return tokens
+
+
+def tokenize_many(lines: Iterable[str], errors: Optional[list[IDSSyntaxError]] = None) -> Iterator[list[str]]:
+    for number, line in enumerate(lines, 1):
+        if not line or line.isspace():
+            yield []
+            continue
+        try:
+            yield tokenize(line, strict=True)
+        except IDSSyntaxError as e:
+            e.line = number
+            if errors is None:
+                raise
+            errors.append(e)
+            yield []
+
+
+# A node is owned either by its anytree `parent` (as an operand) or by the wrapping `IDS` whose `char` it is;
+# writes that change a node's uid or repr invalidate the caches up through both links.
+
+
+def _owner(node: Union[Char, IDS]) -> Optional[IDS]:
+    return node.parent if node.parent is not None else node._wrapper
+
+
 class Char(NodeMixin):
+    _wrapper: Optional[IDS] = None
+
     def __init__(self, shape: str, note: str = ""):
-        self.shape = shape
+        self._shape = shape
         self.note = note
         self.parent = None
 
     def __repr__(self) -> str:
         return f"[{self.shape}]"
 
+    @property
+    def shape(self) -> str:
+        return self._shape
+
+    @shape.setter
+    def shape(self, shape: str) -> None:
+        self._shape = shape
+        owner = _owner(self)
+        if isinstance(owner, IDS):
+            owner._invalidate()
+
+    @property
+    def uid(self) -> int:
+        return SUBTREES.intern((self.shape,))
+
+    def _post_attach(self, parent) -> None:
+        if isinstance(parent, IDS):
+            parent._invalidate()
+
+    _post_detach = _post_attach
+
 
 class IDS(NodeMixin):
+    _uid: Optional[int] = None
+    _repr: Optional[str] = None
+    _wrapper: Optional[IDS] = None
+
     def __init__(self, *args, note: str = ""):
         self.note = note
         self.parent = None
@@ -78,67 +230,97 @@ class IDS(NodeMixin):
         else:
             raise ValueError("Invalid IDS initialization")
 
+    @property
+    def operator(self) -> Optional[IDC_]:
+        return self._operator
+
+    @operator.setter
+    def operator(self, operator: Optional[IDC_]) -> None:
+        self._operator = operator
+        self._invalidate()
+
+    @property
+    def char(self) -> Optional[Union[Char, IDS]]:
+        return self._char
+
+    @char.setter
+    def char(self, char: Optional[Union[Char, IDS]]) -> None:
+        previous = getattr(self, "_char", None)
+        if previous is not None and previous._wrapper is self:
+            previous._wrapper = None
+        if char is not None:
+            char._wrapper = self
+        self._char = char
+        self._invalidate()
+
+    @property
+    def uid(self) -> int:
+        uid = self._uid
+        if uid is None:
+            if self.operator is None:
+                uid = self.char.uid
+            else:
+                uid = SUBTREES.intern((self.operator, *(child.uid for child in self.children)))
+            self._uid = uid
+        return uid
+
+    def _invalidate(self) -> None:
+        node = self
+        while node is not None and (node._uid is not None or node._repr is not None):
+            node._uid = None
+            node._repr = None
+            node = _owner(node)
+
+    def _post_attach(self, parent) -> None:
+        if isinstance(parent, IDS):
+            parent._invalidate()
+
+    _post_detach = _post_attach
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (IDS, CompactIDS)):
+            return self.uid == other.uid
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return self.uid
+
     @staticmethod
     def from_str(ids: str) -> Optional[IDS]:
         if not ids:
             return None
+        return _build_ids(tokenize(ids))
 
-        def parse(index: int):
-            while index < len(ids) and ids[index].isspace():
-                index += 1
-            if index >= len(ids):
-                raise ValueError(f"Unexpected end of string: {ids}")
-            if ids[index] in IDC.ALL:
-                operator = ids[index]
-                index += 1
-                operands = []
-                for _ in range(IDC.arity(operator)):
-                    while index < len(ids) and ids[index].isspace():
-                        index += 1
-                    node, index = parse(index)
-                    operands.append(node)
-                node = IDS(operator, *operands)
-                return node, index
+    def __repr__(self) -> str:
+        if self._repr is None:
+            if self.operator is None:
+                self._repr = repr(self.char)
             else:
-                c = ids[index]
-                if c in IDC.ALL or c in "()":
-                    raise ValueError(f"Unexpected character: {c}")
-                index += 1
-                if index < len(ids) and ids[index] == "(":
-                    index += 1
-                    if index >= len(ids):
-                        raise ValueError("Unexpected end of string after '('")
-                    c2 = ids[index]
-                    if c2 in IDC.ALL or c2 in "()":
-                        raise ValueError(f"Unexpected character in parentheses: {c2}")
-                    index += 1
-                    if index >= len(ids) or ids[index] != ")":
-                        raise ValueError("Expected ')'")
-                    index += 1
-                    node = Char(f"{c}({c2})")
-                    return IDS(node), index
-                else:
-                    node = Char(c)
-                    return IDS(node), index
+                self._repr = self.operator + "".join(repr(child) for child in self.children)
+        return self._repr
 
-        node, index = parse(0)
-        return node
-
-    def __repr__(self) -> str:
-        def prefix(node):
+    def tokens(self) -> Iterator[str]:
+        stack: list[Union[IDS, Char]] = [self]
+        while stack:
+            node = stack.pop()
             if isinstance(node, Char):
-                return repr(node)
-            elif isinstance(node, IDS):
-                if node.operator is None:
-                    return prefix(node.char)
-                else:
-                    return str(node.operator) + "".join(prefix(child) for child in node.children)
+                yield node.shape
+            elif node.operator is None:
+                stack.append(node.char)
             else:
-                return ""
+                yield node.operator
+                stack.extend(reversed(node.children))
 
-        return prefix(self)
+    def encode(self) -> bytes:
+        return encode_tokens(self.tokens())
+
+    @staticmethod
+    def decode(data: bytes) -> IDS:
+        return _build_ids(decode_tokens(data))
 
     def chars(self) -> list[Char]:
+        if self.operator is None:
+            return self.char.chars() if isinstance(self.char, IDS) else [self.char]
         chars = []
         for child in self.children:
             if isinstance(child, Char):
@@ -157,3 +339,410 @@ class IDS(NodeMixin):
                 raise TypeError("Node must be Char or IDS")
 
         return count_children(self)
+
+    def compact(self) -> CompactIDS:
+        return CompactIDS.from_ids(self)
+
+    @property
+    def canonical_key(self) -> int:
+        return SUBTREES.normalize(self.uid)
+
+    def normalized(self) -> IDS:
+        return SUBTREES.to_ids(self.canonical_key)
+
+
+# Compact representation: one flat prefix-order array per IDS. Codes below `_FIRST_COMPONENT` are
+# operators (indices into `IDC.ORDER`), the rest are component shapes interned in `COMPONENTS`.
+
+
+class Codebook:
+    __slots__ = ("shapes", "codes")
+
+    def __init__(self) -> None:
+        self.shapes: list[str] = []
+        self.codes: dict[str, int] = {}
+
+    def encode(self, shape: str) -> int:
+        code = self.codes.get(shape)
+        if code is None:
+            code = self.codes[shape] = len(self.shapes)
+            self.shapes.append(shape)
+        return code
+
+    def decode(self, code: int) -> str:
+        return self.shapes[code]
+
+    def __len__(self) -> int:
+        return len(self.shapes)
+
+
+COMPONENTS = Codebook()
+_OPERATOR_CODES = {op: code for code, op in enumerate(IDC.ORDER)}
+_ARITIES = tuple(IDC.arity(op) for op in IDC.ORDER)
+_FIRST_COMPONENT = len(IDC.ORDER)
+
+
+def _encode_token(token: str) -> int:
+    code = _OPERATOR_CODES.get(token)
+    return code if code is not None else _FIRST_COMPONENT + COMPONENTS.encode(token)
+
+
+def _decode_token(code: int) -> str:
+    return IDC.ORDER[code] if code < _FIRST_COMPONENT else COMPONENTS.decode(code - _FIRST_COMPONENT)
+
+
+def subtree_end(codes: Sequence[int], index: int) -> int:
+    pending = 1
+    while pending:
+        code = codes[index]
+        pending += _ARITIES[code] - 1 if code < _FIRST_COMPONENT else -1
+        index += 1
+    return index
+
+
+def _build_ids(tokens: Iterable[str]) -> IDS:
+    stack: list[tuple[IDC_, list[IDS]]] = []
+    for token in tokens:
+        if token in IDC.ALL:
+            stack.append((token, []))
+            continue
+        node = IDS(Char(token))
+        while stack:
+            operator, operands = stack[-1]
+            operands.append(node)
+            if len(operands) < IDC.arity(operator):
+                break
+            stack.pop()
+            node = IDS(operator, *operands)
+        else:
+            return node
+    raise ValueError("Incomplete IDS")
+
+
+class CompactIDS:
+    __slots__ = ("codes", "start", "end", "note")
+
+    def __init__(self, codes: Sequence[int], start: int = 0, end: Optional[int] = None, note: str = ""):
+        self.codes = codes
+        self.start = start
+        self.end = len(codes) if end is None else end
+        self.note = note
+
+    @staticmethod
+    def from_str(ids: str) -> Optional[CompactIDS]:
+        if not ids:
+            return None
+        return CompactIDS(array("I", map(_encode_token, tokenize(ids))))
+
+    @staticmethod
+    def from_tokens(tokens: Iterable[str]) -> CompactIDS:
+        return CompactIDS(array("I", map(_encode_token, tokens)))
+
+    @staticmethod
+    def parse_many(lines: Iterable[str], errors: Optional[list[IDSSyntaxError]] = None) -> Iterator[Optional[CompactIDS]]:
+        for tokens in tokenize_many(lines, errors):
+            yield CompactIDS(array("I", map(_encode_token, tokens))) if tokens else None
+
+    @staticmethod
+    def from_ids(ids: IDS) -> CompactIDS:
+        return CompactIDS(array("I", map(_encode_token, ids.tokens())), note=ids.note)
+
+    @staticmethod
+    def decode(data: bytes) -> CompactIDS:
+        return CompactIDS(array("I", map(_encode_token, decode_tokens(data))))
+
+    def encode(self) -> bytes:
+        return encode_tokens(self.tokens())
+
+    def to_ids(self) -> IDS:
+        return _build_ids(self.tokens())
+
+    def tokens(self) -> Iterator[str]:
+        return map(_decode_token, self.codes[self.start : self.end])
+
+    def numpy(self):
+        import numpy
+
+        return numpy.asarray(self.codes[self.start : self.end], dtype=numpy.uint32)
+
+    @property
+    def operator(self) -> Optional[IDC_]:
+        code = self.codes[self.start]
+        return IDC.ORDER[code] if code < _FIRST_COMPONENT else None
+
+    @property
+    def char(self) -> Optional[Char]:
+        code = self.codes[self.start]
+        return Char(COMPONENTS.decode(code - _FIRST_COMPONENT)) if code >= _FIRST_COMPONENT else None
+
+    @property
+    def children(self) -> tuple[CompactIDS, ...]:
+        code = self.codes[self.start]
+        if code >= _FIRST_COMPONENT:
+            return ()
+        children = []
+        index = self.start + 1
+        for _ in range(_ARITIES[code]):
+            end = subtree_end(self.codes, index)
+            children.append(CompactIDS(self.codes, index, end))
+            index = end
+        return tuple(children)
+
+    def __repr__(self) -> str:
+        return "".join(
+            IDC.ORDER[code] if code < _FIRST_COMPONENT else f"[{COMPONENTS.decode(code - _FIRST_COMPONENT)}]"
+            for code in self.codes[self.start : self.end]
+        )
+
+    def chars(self) -> list[Char]:
+        return [Char(COMPONENTS.decode(code - _FIRST_COMPONENT)) for code in self.codes[self.start : self.end] if code >= _FIRST_COMPONENT]
+
+    def count(self) -> int:
+        return self.end - self.start
+
+    @property
+    def uid(self) -> int:
+        return SUBTREES.intern_tokens(self.tokens())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, CompactIDS) and self.codes is other.codes and self.start == other.start and self.end == other.end:
+            return True
+        if isinstance(other, (IDS, CompactIDS)):
+            return self.uid == other.uid
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return self.uid
+
+
+class CompactIDSList:
+    __slots__ = ("codes", "offsets")
+
+    def __init__(self, items: Iterable[Union[str, IDS, CompactIDS]] = ()):
+        self.codes = array("I")
+        self.offsets = array("I", [0])
+        for item in items:
+            self.append(item)
+
+    def append(self, ids: Union[str, IDS, CompactIDS]) -> None:
+        if isinstance(ids, str):
+            codes = array("I", map(_encode_token, tokenize(ids)))
+        elif isinstance(ids, IDS):
+            codes = CompactIDS.from_ids(ids).codes
+        else:
+            codes = ids.codes[ids.start : ids.end]
+        self.codes.extend(codes)
+        self.offsets.append(len(self.codes))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> Optional[CompactIDS]:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("CompactIDSList index out of range")
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return CompactIDS(self.codes, start, end) if end > start else None
+
+    def __iter__(self) -> Iterator[Optional[CompactIDS]]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+# Hash-consing table: every distinct subtree is stored once as a tuple, `(shape,)` for a component and
+# `(operator, *operand_uids)` otherwise, and is identified by its index. Equal subtrees share one uid.
+
+
+class SubtreeTable:
+    __slots__ = ("nodes", "uids", "reprs", "normals")
+
+    def __init__(self) -> None:
+        self.nodes: list[tuple] = []
+        self.uids: dict[tuple, int] = {}
+        self.reprs: dict[int, str] = {}
+        self.normals: dict[int, int] = {}
+
+    def intern(self, node: tuple) -> int:
+        uid = self.uids.get(node)
+        if uid is None:
+            uid = self.uids[node] = len(self.nodes)
+            self.nodes.append(node)
+        return uid
+
+    def intern_tokens(self, tokens: Iterable[str]) -> int:
+        stack: list[list] = []
+        for token in tokens:
+            if token in _ARITY_OF:
+                stack.append([token])
+                continue
+            uid = self.intern((token,))
+            while stack:
+                node = stack[-1]
+                node.append(uid)
+                if len(node) <= _ARITY_OF[node[0]]:
+                    break
+                stack.pop()
+                uid = self.intern(tuple(node))
+            else:
+                return uid
+        raise ValueError("Incomplete IDS")
+
+    def intern_str(self, ids: str) -> Optional[int]:
+        if not ids:
+            return None
+        return self.intern_tokens(tokenize(ids))
+
+    def tokens(self, uid: int) -> Iterator[str]:
+        stack = [uid]
+        while stack:
+            node = self.nodes[stack.pop()]
+            yield node[0]
+            stack.extend(reversed(node[1:]))
+
+    def to_ids(self, uid: int) -> IDS:
+        return _build_ids(self.tokens(uid))
+
+    def repr(self, uid: int) -> str:
+        text = self.reprs.get(uid)
+        if text is None:
+            node = self.nodes[uid]
+            if len(node) == 1:
+                text = f"[{node[0]}]"
+            else:
+                text = node[0] + "".join(self.repr(child) for child in node[1:])
+            self.reprs[uid] = text
+        return text
+
+    # Normal form of the abstract operators:
+    # - chains of `⿰`/`⿲` (and of `⿱`/`⿳`) are flattened all the way down, including `⿲ A A A` triples, and
+    #   rebuilt as `⿰` for two operands, `⿲` (`⿳`) for three and right-nested `⿰ A …` (`⿱ A …`) beyond that;
+    # - a subtree made of exactly three identical components is `⿲ A A A`, however they are arranged, so a `⿱`
+    #   chain ending in three identical components ends in one `⿲ A A A` link;
+    # - every subtree of a normal form is itself normal, so `normalize` is idempotent;
+    # - the operands of `⿻` are ordered, since overlapping is symmetric.
+    def normalize(self, uid: int) -> int:
+        normal = self.normals.get(uid)
+        if normal is None:
+            node = self.nodes[uid]
+            if len(node) == 1:
+                normal = uid
+            else:
+                operator, operands = node[0], [self.normalize(child) for child in node[1:]]
+                family = _CHAINS.get(operator)
+                if family is not None:
+                    normal = self._chain(family, [item for child in operands for item in self._links(family, child)])
+                elif operator == IDC.XX:
+                    normal = self.intern((operator, *sorted(operands, key=self.repr)))
+                else:
+                    normal = self.intern((operator, *operands))
+                normal = self._triple(normal)
+            self.normals[uid] = normal
+        return normal
+
+    def _links(self, family: tuple[IDC_, IDC_], uid: int) -> list[int]:
+        node = self.nodes[uid]
+        if node[0] not in family:
+            return [uid]
+        return [item for child in node[1:] for item in self._links(family, child)]
+
+    def _chain(self, family: tuple[IDC_, IDC_], items: list[int]) -> int:
+        if len(items) == 2:
+            return self.intern((family[0], *items))
+        tail = self._triple(self.intern((family[1], *items[-3:])))
+        if len(items) == 3:
+            return tail
+        if self.nodes[tail][0] not in family:
+            # a vertical run ending in three identical components ends in their `⿲` triple, which is one link
+            return self._chain(family, [*items[:-3], tail])
+        return self.intern((family[0], items[0], self._chain(family, items[1:])))
+
+    def _triple(self, uid: int) -> int:
+        leaves = []
+        for token in self.tokens(uid):
+            if token not in _ARITY_OF:
+                leaves.append(token)
+                if len(leaves) > 3:
+                    return uid
+        if len(leaves) == 3 and leaves[0] == leaves[1] == leaves[2]:
+            leaf = self.intern((leaves[0],))
+            return self.intern((IDC.LL, leaf, leaf, leaf))
+        return uid
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+
+SUBTREES = SubtreeTable()
+_CHAINS = {IDC.LR: (IDC.LR, IDC.LL), IDC.LL: (IDC.LR, IDC.LL), IDC.UD: (IDC.UD, IDC.UU), IDC.UU: (IDC.UD, IDC.UU)}
+
+
+def normalize(ids: IDS) -> IDS:
+    return ids.normalized()
+
+
+@lru_cache(maxsize=None)
+def canonical_key(ids: str) -> Optional[int]:
+    # strict, so that a shape with trailing tokens raises instead of sharing the key of its first complete IDS
+    if not ids:
+        return None
+    return SUBTREES.normalize(SUBTREES.intern_tokens(tokenize(ids, strict=True)))
+
+
+# Binary encoding: an operator is one byte (its index in `IDC.ORDER`); a component `A` or `A(B)` is the
+# LEB128 varint of `_FIRST_COMPONENT + (ord(A) << 1 | has_parentheses)`, followed by the varint of `ord(B)`.
+# Codes depend on code points only, so encoded IDS stay valid across processes.
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_tokens(tokens: Iterable[str]) -> bytes:
+    out = bytearray()
+    for token in tokens:
+        code = _OPERATOR_CODES.get(token)
+        if code is not None:
+            out.append(code)
+        elif len(token) == 1:
+            _write_varint(out, _FIRST_COMPONENT + (ord(token) << 1))
+        elif len(token) == 4 and token[1] == "(" and token[3] == ")":
+            _write_varint(out, _FIRST_COMPONENT + (ord(token[0]) << 1 | 1))
+            _write_varint(out, ord(token[2]))
+        else:
+            raise ValueError(f"Cannot encode component: {token}")
+    return bytes(out)
+
+
+def decode_tokens(data: bytes) -> Iterator[str]:
+    index, length, inner = 0, len(data), None
+    while index < length:
+        value = shift = 0
+        while True:
+            if index >= length:
+                raise ValueError("Truncated IDS encoding")
+            byte = data[index]
+            index += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        if inner is not None:
+            yield f"{inner}({chr(value)})"
+            inner = None
+        elif value < _FIRST_COMPONENT:
+            yield IDC.ORDER[value]
+        elif value - _FIRST_COMPONENT & 1:
+            inner = chr(value - _FIRST_COMPONENT >> 1)
+        else:
+            yield chr(value - _FIRST_COMPONENT >> 1)
+    if inner is not None:
+        raise ValueError("Truncated IDS encoding")
+
+
+@lru_cache(maxsize=None)
+def canonical_str(ids: str) -> str:
+    return "".join(token if token in _ARITY_OF else f"[{token}]" for token in tokenize(ids))
@@ -0,0 +1,143 @@
+import json
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Union
+
+import yaml
+
+from ids import IDC, IDC_, IDS, IDSSyntaxError, tokenize, tokenize_many
+
+REPO_DIR = Path(__file__).parent.parent
+ASS_FILE = REPO_DIR / "result" / "iterative_ass.yaml"
+
+ARITY = {op: IDC.arity(op) for op in IDC.ORDER}
+
+# a query term is a component shape, or a `(shape, operator, slot)` position where `slot` may be None
+Position = tuple[str, Optional[IDC_], Optional[int]]
+Term = Union[str, Position]
+
+
+def entry_shapes(entries: Iterable[dict], errors: Optional[list[IDSSyntaxError]] = None) -> Iterator[tuple[str, list[str]]]:
+    # entries as produced by `build_json.parse_dict`, or the `entries` of `abstract.json`
+    pairs = [(entry["char"], entry.get("new_ids") or entry["ids"]) for entry in entries if entry.get("char") and entry.get("ids")]
+    for (char, _), tokens in zip(pairs, tokenize_many((ids for _, ids in pairs), errors if errors is not None else [])):
+        if tokens:
+            yield char, tokens
+
+
+def ass_shapes(ass_dict: dict[str, str], errors: Optional[list[IDSSyntaxError]] = None) -> Iterator[tuple[str, list[str]]]:
+    # values as in `result/iterative_ass.yaml`; shapes that do not parse (e.g. `↷`) go to `errors`
+    chars = [char for char, shape in ass_dict.items() if shape != "X"]
+    for char, tokens in zip(chars, tokenize_many((ass_dict[char] for char in chars), errors if errors is not None else [])):
+        if tokens:
+            yield char, tokens
+
+
+def load_shapes(path: Path = ASS_FILE, errors: Optional[list[IDSSyntaxError]] = None) -> Iterator[tuple[str, list[str]]]:
+    with path.open("r", encoding="utf-8") as f:
+        if path.suffix == ".json":
+            return entry_shapes(json.load(f)["entries"], errors)
+        return ass_shapes(yaml.load(f, Loader=yaml.FullLoader), errors)
+
+
+class ComponentIndex:
+    def __init__(self) -> None:
+        self.components: dict[str, set[str]] = {}
+        self.slots: dict[Position, set[str]] = {}  # position under the direct parent operator
+        self.within: dict[Position, set[str]] = {}  # position under any ancestor operator
+        self.shapes: dict[str, list[str]] = {}
+
+    @classmethod
+    def from_shapes(cls, shapes: Iterable[tuple[str, list[str]]]) -> "ComponentIndex":
+        index = cls()
+        for char, tokens in shapes:
+            index.add_tokens(char, tokens)
+        return index
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[dict], errors: Optional[list[IDSSyntaxError]] = None) -> "ComponentIndex":
+        return cls.from_shapes(entry_shapes(entries, errors))
+
+    @classmethod
+    def from_ass(cls, ass_dict: dict[str, str], errors: Optional[list[IDSSyntaxError]] = None) -> "ComponentIndex":
+        return cls.from_shapes(ass_shapes(ass_dict, errors))
+
+    @classmethod
+    def load(cls, path: Path = ASS_FILE, errors: Optional[list[IDSSyntaxError]] = None) -> "ComponentIndex":
+        return cls.from_shapes(load_shapes(path, errors))
+
+    def add(self, char: str, ids: Union[str, IDS]) -> None:
+        self.add_tokens(char, list(ids.tokens()) if isinstance(ids, IDS) else tokenize(ids))
+
+    def add_tokens(self, char: str, tokens: list[str]) -> None:
+        self.shapes.setdefault(char, []).append("".join(token if token in ARITY else f"[{token}]" for token in tokens))
+        stack: list[list] = []  # [operator, number of slots entered so far]
+        for token in tokens:
+            if stack:
+                stack[-1][1] += 1
+            if token in ARITY:
+                stack.append([token, 0])
+                continue
+
+            self.components.setdefault(token, set()).add(char)
+            if not stack:
+                self.slots.setdefault((token, None, None), set()).add(char)
+                continue
+            operator, entered = stack[-1]
+            self.slots.setdefault((token, operator, entered - 1), set()).add(char)
+            self.slots.setdefault((token, operator, None), set()).add(char)
+            for operator, entered in stack:
+                self.within.setdefault((token, operator, entered - 1), set()).add(char)
+                self.within.setdefault((token, operator, None), set()).add(char)
+            while stack and stack[-1][1] == ARITY[stack[-1][0]]:
+                stack.pop()
+
+    def postings(self, term: Term, direct: bool = False) -> set[str]:
+        if isinstance(term, str):
+            return self.components.get(term, set())
+        table = self.slots if direct or term[1] is None else self.within
+        return table.get(term, set())
+
+    def query(self, *terms: Term, direct: bool = False) -> set[str]:
+        postings = sorted((self.postings(term, direct) for term in terms), key=len)
+        if not postings:
+            return set()
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
+
+    def chars_with(self, *components: str) -> set[str]:
+        return self.query(*components)
+
+    def chars_at(self, component: str, operator: IDC_, slot: Optional[int] = None, direct: bool = False) -> set[str]:
+        return self.query((component, operator, slot), direct=direct)
+
+    def __len__(self) -> int:
+        return len(self.shapes)
+
+
+def parse_term(text: str) -> Term:
+    # `亻` anywhere, `亻@⿰` anywhere under a `⿰`, `亻@⿰0` in the left slot of a `⿰`
+    component, _, position = text.partition("@")
+    if not position:
+        return component
+    return component, position[0], int(position[1:]) if position[1:] else None
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    args = sys.argv[1:]
+    path = Path(args.pop(0)) if args and args[0].endswith((".yaml", ".json")) else ASS_FILE
+    begin = time.perf_counter()
+    index = ComponentIndex.load(path)
+    print(f"Indexed {len(index)} characters in {time.perf_counter() - begin:.3f}s")
+    terms = [parse_term(arg) for arg in args]
+    if terms:
+        begin = time.perf_counter()
+        result = index.query(*terms)
+        print(f"{len(result)} characters in {(time.perf_counter() - begin) * 1000:.2f}ms")
+        print("".join(sorted(result)))
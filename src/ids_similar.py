@@ -0,0 +1,148 @@
+import math
+from typing import Iterable, Iterator, Optional, Union
+
+from ids import IDC, SUBTREES
+from ids_index import ASS_FILE, load_shapes
+
+ARITY = {op: IDC.arity(op) for op in IDC.ORDER}
+THRESHOLDS = (0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3, 0.2, 0.1)
+
+
+def shingles(tokens: Iterable[str]) -> set[str]:
+    # pq-gram-like features of the normal form: the root, every component, every operand under its parent
+    # operator and slot, and every component under its two nearest (operator, slot) ancestors
+    tokens = list(SUBTREES.tokens(SUBTREES.normalize(SUBTREES.intern_tokens(tokens))))
+    result = {f"^{tokens[0]}"}
+    stack: list[list] = []  # [operator, number of slots entered so far]
+    for token in tokens:
+        if stack:
+            stack[-1][1] += 1
+            parent = f"{stack[-1][0]}{stack[-1][1] - 1}"
+            result.add(f"{parent}/{token}")
+            if len(stack) > 1:
+                result.add(f"{stack[-2][0]}{stack[-2][1] - 1}/{parent}/{token}")
+        if token in ARITY:
+            stack.append([token, 0])
+            continue
+        result.add(token)
+        while stack and stack[-1][1] == ARITY[stack[-1][0]]:
+            stack.pop()
+    return result
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    overlap = len(a & b)
+    return overlap / (len(a) + len(b) - overlap)
+
+
+def prefix_length(size: int, threshold: float) -> int:
+    # any record sharing at least `threshold` (Jaccard) with a record of `size` shingles shares one of these
+    return size - math.ceil(threshold * size - 1e-9) + 1
+
+
+class SimilarityIndex:
+    # Shingles are ranked from rarest to most frequent, and every record keeps them in that order, so that
+    # prefix filtering only has to probe the short posting lists of rare shingles.
+    def __init__(self, shapes: Iterable[tuple[str, list[str]]] = ()):
+        self.chars: list[str] = []
+        self.sets: list[frozenset] = []
+        self.records: list[tuple[int, ...]] = []
+        self.ranks: dict[str, int] = {}
+        self.postings: dict[int, list[int]] = {}
+        self.by_char: dict[str, list[int]] = {}
+
+        features = []
+        for char, tokens in shapes:
+            self.by_char.setdefault(char, []).append(len(self.chars))
+            self.chars.append(char)
+            features.append(shingles(tokens))
+        counts: dict[str, int] = {}
+        for feature in features:
+            for shingle in feature:
+                counts[shingle] = counts.get(shingle, 0) + 1
+        self.ranks = {shingle: rank for rank, shingle in enumerate(sorted(counts, key=lambda shingle: (counts[shingle], shingle)))}
+        for record_id, feature in enumerate(features):
+            record = self.encode(feature)
+            self.records.append(record)
+            self.sets.append(frozenset(record))
+            for rank in record:
+                self.postings.setdefault(rank, []).append(record_id)
+
+    @classmethod
+    def load(cls, path=ASS_FILE) -> "SimilarityIndex":
+        return cls(load_shapes(path, []))
+
+    def encode(self, feature: set[str]) -> tuple[int, ...]:
+        # shingles unknown to the index get distinct negative ranks: rarest of all, and in no posting list
+        unknown = iter(range(-1, -len(feature) - 1, -1))
+        return tuple(sorted(self.ranks.get(shingle) if shingle in self.ranks else next(unknown) for shingle in feature))
+
+    def nearest(self, query: Union[str, list[str]], k: int = 10, min_similarity: float = 0.1) -> list[tuple[str, float]]:
+        # `query` is an indexed character or the tokens of a shape; thresholds are lowered until `k` characters
+        # are found above the current one, so only the rare end of each posting list is visited
+        if isinstance(query, str):
+            exclude = query
+            records = [self.records[record_id] for record_id in self.by_char.get(query, [])]
+        else:
+            exclude = None
+            records = [self.encode(shingles(query))]
+
+        best: dict[str, float] = {}
+        for record in records:
+            record_set, probed, seen = frozenset(record), 0, set()
+            for threshold in THRESHOLDS:
+                if threshold < min_similarity:
+                    break
+                end = prefix_length(len(record), threshold)
+                for rank in record[probed:end]:
+                    for record_id in self.postings.get(rank, ()):
+                        if record_id in seen:
+                            continue
+                        seen.add(record_id)
+                        char = self.chars[record_id]
+                        similarity = jaccard(record_set, self.sets[record_id])
+                        if char != exclude and similarity >= min_similarity and similarity > best.get(char, 0):
+                            best[char] = similarity
+                probed = max(probed, end)
+                if sum(1 for similarity in best.values() if similarity >= threshold) >= k:
+                    break
+        return sorted(best.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    def pairs(self, threshold: float = 0.8) -> Iterator[tuple[str, str, float]]:
+        # all-pairs similarity join: records are visited by size and only their prefixes are indexed, so a
+        # pair is verified only if it shares a rare shingle and passes the size filter
+        index: dict[int, list[int]] = {}
+        reported: dict[tuple[str, str], float] = {}
+        for record_id in sorted(range(len(self.records)), key=lambda record_id: len(self.records[record_id])):
+            record = self.records[record_id]
+            prefix = record[: prefix_length(len(record), threshold)]
+            candidates = {other for rank in prefix for other in index.get(rank, ()) if len(self.records[other]) >= threshold * len(record)}
+            for other in candidates:
+                pair = tuple(sorted((self.chars[record_id], self.chars[other])))
+                if pair[0] == pair[1] or pair in reported:
+                    continue
+                similarity = jaccard(self.sets[record_id], self.sets[other])
+                if similarity >= threshold:
+                    reported[pair] = similarity
+                    yield pair[0], pair[1], similarity
+            for rank in prefix:
+                index.setdefault(rank, []).append(record_id)
+
+    def __len__(self) -> int:
+        return len(self.by_char)
+
+
+def main(query: Optional[str] = None, threshold: float = 0.8) -> None:
+    index = SimilarityIndex.load()
+    if query:
+        for char, similarity in index.nearest(query):
+            print(f"{char}\t{similarity:.3f}")
+    else:
+        for a, b, similarity in index.pairs(threshold):
+            print(f"{a}\t{b}\t{similarity:.3f}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    main(*sys.argv[1:2], *map(float, sys.argv[2:3]))
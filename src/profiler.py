@@ -0,0 +1,80 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+
+class Stage:
+    __slots__ = ("name", "wall", "cpu", "peak", "count")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak = 0
+        self.count: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "wall": round(self.wall, 4), "cpu": round(self.cpu, 4), "peak_mib": round(self.peak / 2**20, 2), "count": self.count}
+
+
+class Profiler:
+    # Wall time, CPU time, peak traced memory and item count of each stage of a build. A disabled profiler
+    # still hands out stages, so that the pipeline does not have to check, but measures nothing.
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.stages: list[Stage] = []
+        self._tracing = False
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Stage]:
+        stage = Stage(name)
+        if not self.enabled:
+            yield stage
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield stage
+        finally:
+            stage.wall = time.perf_counter() - wall
+            stage.cpu = time.process_time() - cpu
+            stage.peak = tracemalloc.get_traced_memory()[1]
+            self.stages.append(stage)
+
+    def total(self) -> Stage:
+        total = Stage("total")
+        total.wall = sum(stage.wall for stage in self.stages)
+        total.cpu = sum(stage.cpu for stage in self.stages)
+        total.peak = max((stage.peak for stage in self.stages), default=0)
+        return total
+
+    def report(self) -> dict:
+        return {"date": datetime.now().isoformat(timespec="seconds"), "stages": [stage.to_dict() for stage in self.stages], "total": self.total().to_dict()}
+
+    def write(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+    def columns(self) -> list[str]:
+        # key numbers for `statistics.tsv`: total wall seconds and peak MiB
+        total = self.total()
+        return [f"{total.wall:.3f}", f"{total.peak / 2**20:.1f}"]
+
+    def stop(self) -> None:
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def print(self) -> None:
+        print(f"{'stage':<20}{'wall':>9}{'cpu':>9}{'MiB':>9}{'count':>9}")
+        for stage in [*self.stages, self.total()]:
+            count = "" if stage.count is None else stage.count
+            print(f"{stage.name:<20}{stage.wall:>9.3f}{stage.cpu:>9.3f}{stage.peak / 2**20:>9.1f}{count:>9}")
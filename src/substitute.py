@@ -0,0 +1,31 @@
+import re
+
+BIBLIOGRAPHY = {
+    "“": "「",
+    "”": "」",
+    "‘": "『",
+    "’": "』",
+    "·": "・",
+    "…": "⋯",
+    "SW": "《说文解字》",
+    "GY": "《广韵》",
+    "CY": "《常用漢字表》（日本）",
+    "ZG": "《中国语言资源保护工程汉语方言用字规范》",
+    "JY": "《集韵》",
+    "WS": "《和製漢字の辞典（2014）》",
+    "FY": "《汉语方言大字典》",
+}
+
+
+class Substituter:
+    # every key in one alternation, longest first, so that a string is rewritten in a single scan and the
+    # longest key wins where keys overlap
+    def __init__(self, mapping: dict[str, str]):
+        self.mapping = dict(mapping)
+        keys = sorted(self.mapping, key=len, reverse=True)
+        self.pattern = re.compile("|".join(map(re.escape, keys))) if keys else None
+
+    def __call__(self, value: str) -> str:
+        if self.pattern is None:
+            return value
+        return self.pattern.sub(lambda match: self.mapping[match.group()], value)
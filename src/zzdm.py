@@ -0,0 +1,121 @@
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+import yaml
+
+from ids import CompactIDS, CompactIDSList, IDSSyntaxError, subtree_end, tokenize
+from ids_index import ASS_FILE, load_shapes
+
+REPO_DIR = Path(__file__).parent.parent
+CHART_FILE = REPO_DIR / "zzdm" / "chart.yaml"
+RESULT_FILE = REPO_DIR / "result" / "zzdm.tsv"
+
+WILDCARD = "？"
+WILDCARD_CODE = CompactIDS.from_tokens([WILDCARD]).codes[0]
+NO_OPERAND = -1
+
+
+class Pattern:
+    __slots__ = ("name", "codes", "key")
+
+    def __init__(self, name: str, template: Union[str, list[str]]):
+        tokens = tokenize(template, strict=True) if isinstance(template, str) else [str(token).strip() for token in template]
+        codes = CompactIDS.from_tokens(tokens).codes
+        try:
+            complete = subtree_end(codes, 0) == len(codes)
+        except IndexError:
+            complete = False
+        if not complete:
+            raise ValueError(f"Incomplete pattern {name}: {template}")
+        self.name = name
+        self.codes = codes
+        self.key = (codes[0], codes[1] if len(codes) > 1 else NO_OPERAND)
+
+    def match(self, codes, start: int = 0) -> bool:
+        index = start
+        for code in self.codes:
+            if code == WILDCARD_CODE:
+                index = subtree_end(codes, index)
+            elif code != codes[index]:
+                return False
+            else:
+                index += 1
+        return True
+
+
+class ChartMatcher:
+    def __init__(self, patterns: Iterable[Pattern] = ()):
+        # patterns are bucketed on (root operator, first operand); a wildcard in either place gets its own bucket
+        self.buckets: dict[tuple[int, int], list[Pattern]] = {}
+        for pattern in patterns:
+            self.add(pattern)
+
+    @classmethod
+    def from_chart(cls, chart: dict[str, list], skipped: Optional[list[tuple[str, object]]] = None) -> "ChartMatcher":
+        # only the structural templates (`[⿰, 亻, ？]`, `[文]`) are compiled; the shorthand strings and the
+        # `~`, `!`, `(null)` markers of the chart are passed to `skipped`
+        matcher = cls()
+        for name, templates in chart.items():
+            for template in templates or []:
+                if isinstance(template, list):
+                    matcher.add(Pattern(name, template))
+                elif skipped is not None:
+                    skipped.append((name, template))
+        return matcher
+
+    @classmethod
+    def load(cls, path: Path = CHART_FILE, skipped: Optional[list[tuple[str, object]]] = None) -> "ChartMatcher":
+        with path.open("r", encoding="utf-8") as f:
+            return cls.from_chart(yaml.load(f, Loader=yaml.FullLoader), skipped)
+
+    def add(self, pattern: Pattern) -> None:
+        self.buckets.setdefault(pattern.key, []).append(pattern)
+
+    def candidates(self, codes, start: int, end: int) -> Iterable[Pattern]:
+        root = codes[start]
+        first = codes[start + 1] if end - start > 1 else NO_OPERAND
+        for key in ((root, first), (root, WILDCARD_CODE), (WILDCARD_CODE, NO_OPERAND)):
+            yield from self.buckets.get(key, ())
+
+    def match(self, ids: CompactIDS) -> list[str]:
+        names = []
+        for pattern in self.candidates(ids.codes, ids.start, ids.end):
+            if pattern.name not in names and pattern.match(ids.codes, ids.start):
+                names.append(pattern.name)
+        return names
+
+    def classify(self, shapes: Iterable[tuple[str, list[str]]]) -> dict[str, list[str]]:
+        chars: list[str] = []
+        trees = CompactIDSList()
+        for char, tokens in shapes:
+            chars.append(char)
+            trees.append(CompactIDS.from_tokens(tokens))
+
+        result: dict[str, list[str]] = {}
+        for char, ids in zip(chars, trees):
+            for name in self.match(ids):
+                names = result.setdefault(char, [])
+                if name not in names:
+                    names.append(name)
+        return result
+
+
+def main(ass_path: Path = ASS_FILE) -> None:
+    skipped: list[tuple[str, object]] = []
+    errors: list[IDSSyntaxError] = []
+    matcher = ChartMatcher.load(skipped=skipped)
+    result = matcher.classify(load_shapes(ass_path, errors))
+
+    RESULT_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with RESULT_FILE.open("w", encoding="utf-8") as f:
+        for char, names in sorted(result.items()):
+            f.write(f"{char}\t{' '.join(names)}\n")
+    print(f"Classified {len(result)} characters, {len(errors)} shapes not parsed, {len(skipped)} chart entries not compiled")
+
+
+if __name__ == "__main__":
+    import time
+
+    begin = time.perf_counter()
+    main()
+    print(f"Time cost: {time.perf_counter() - begin:.3f}s")